@@ -0,0 +1,6 @@
+"""Synthetic workloads and a runner timing the engine across sizes.
+
+    python -m benchmarks --sizes 10 20 40
+
+Results go to benchmarks/results/latest.json unless `--output` is given.
+"""
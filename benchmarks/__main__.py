@@ -0,0 +1,157 @@
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any
+
+from rdflib import Graph
+
+from benchmarks.workloads import WORKLOADS
+from knom import single_pass
+from knom.stratified import get_rules_dependencies, stratify_rules
+from knom.util import split_rules_and_facts
+
+# A result slower than the baseline by this factor is reported as a regression
+REGRESSION_FACTOR = 1.5
+
+# Results are written out of the source tree, in an ignored directory
+OUTPUT = Path(__file__).parent / "results" / "latest.json"
+
+
+def _dependencies(facts: Graph, rules: Graph) -> int:  # noqa: ARG001
+    return sum(
+        len(stratum) for stratum in stratify_rules(rules, get_rules_dependencies(rules))
+    )
+
+
+def _single_pass(facts: Graph, rules: Graph) -> int:
+    return sum(1 for _ in single_pass(facts, rules))
+
+
+def _stratified(facts: Graph, rules: Graph) -> int:
+    from knom.stratified import stratified
+
+    return len(stratified(facts, rules))
+
+
+def _parallel(facts: Graph, rules: Graph) -> int:
+    from knom.parallel import parallel_stratified
+
+    return len(parallel_stratified(facts, rules))
+
+
+OPERATIONS: dict[str, Callable[[Graph, Graph], int]] = {
+    "dependencies": _dependencies,
+    "single_pass": _single_pass,
+    "stratified": _stratified,
+    "parallel": _parallel,
+}
+
+
+def measure(operation: str, document: str, repeat: int) -> dict[str, Any]:
+    run = OPERATIONS[operation]
+    times = []
+    for _ in range(repeat):
+        rules, facts = split_rules_and_facts(Graph().parse(data=document, format="n3"))
+        start = time.perf_counter()
+        output = run(facts, rules)
+        times.append(time.perf_counter() - start)
+
+    # Memory is traced in a separate run, tracing slows the engine down
+    rules, facts = split_rules_and_facts(Graph().parse(data=document, format="n3"))
+    tracemalloc.start()
+    try:
+        run(facts, rules)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    seconds = min(times)
+    return {
+        "operation": operation,
+        "facts": len(facts),
+        "rules": len(rules),
+        "output": output,
+        "seconds": seconds,
+        "facts_per_second": len(facts) / seconds if seconds > 0 else None,
+        "output_per_second": output / seconds if seconds > 0 else None,
+        "peak_memory": peak,
+    }
+
+
+def compare(results: list[dict[str, Any]], baseline: list[dict[str, Any]]) -> list[str]:
+    """Describe the results slower than their baseline counterparts."""
+    previous = {
+        (r["workload"], r["size"], r["operation"]): r["seconds"] for r in baseline
+    }
+    regressions = []
+    for result in results:
+        key = (result["workload"], result["size"], result["operation"])
+        if key in previous and result["seconds"] > REGRESSION_FACTOR * previous[key]:
+            name = "/".join(map(str, key))
+            regressions.append(
+                f"{name}: {previous[key]:.4f}s -> {result['seconds']:.4f}s"
+            )
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks",
+        description="Time the engine on synthetic workloads.",
+    )
+    parser.add_argument(
+        "--workloads", nargs="+", choices=sorted(WORKLOADS), default=sorted(WORKLOADS)
+    )
+    parser.add_argument(
+        "--operations",
+        nargs="+",
+        choices=sorted(OPERATIONS),
+        default=sorted(OPERATIONS),
+    )
+    parser.add_argument("--sizes", nargs="+", type=int, default=[8, 16, 32])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", type=Path, default=OUTPUT)
+    parser.add_argument(
+        "--baseline", help="earlier output to check for regressions against"
+    )
+    args = parser.parse_args()
+
+    results = []
+    for workload in args.workloads:
+        for size in args.sizes:
+            document = WORKLOADS[workload](size)
+            for operation in args.operations:
+                result = {
+                    "workload": workload,
+                    "size": size,
+                    **measure(operation, document, args.repeat),
+                }
+                results.append(result)
+                print(  # noqa: T201
+                    f"{workload:10} {size:6} {operation:13} {result['seconds']:9.4f}s "
+                    f"{result['peak_memory'] / 2**20:8.1f}MiB",
+                    file=sys.stderr,
+                )
+
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    with args.output.open("w") as f:
+        json.dump(
+            {"python": platform.python_version(), "results": results}, f, indent=2
+        )
+
+    if args.baseline is not None:
+        with open(args.baseline) as f:  # noqa: PTH123
+            regressions = compare(results, json.load(f)["results"])
+        for regression in regressions:
+            print("regression", regression, file=sys.stderr)  # noqa: T201
+        return 1 if len(regressions) > 0 else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
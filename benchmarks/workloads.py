@@ -0,0 +1,83 @@
+"""Generators of N3 documents, each scaled by a single size parameter."""
+from collections.abc import Callable
+
+PREFIXES = """@prefix : <http://example.com/>.
+@prefix log: <http://www.w3.org/2000/10/swap/log#>.
+@prefix math: <http://www.w3.org/2000/10/swap/math#>.
+@prefix p: <http://example.com/parser#>.
+@prefix test: <http://example.com/test#>.
+"""
+
+TRANSITIVE_RULE = "{ ?x :a ?y. ?y :a ?z } => { ?x :a ?z }.\n"
+
+
+def chain(size: int) -> str:
+    """A chain of size classes, like examples/socrates.n3 made longer."""
+    facts = "".join(f":c{i} :a :c{i + 1}.\n" for i in range(size))
+    return PREFIXES + facts + TRANSITIVE_RULE
+
+
+def tree(size: int) -> str:
+    """A binary class tree of size nodes under the transitive rule."""
+    facts = "".join(f":c{i} :a :c{(i - 1) // 2}.\n" for i in range(1, size))
+    return PREFIXES + facts + TRANSITIVE_RULE
+
+
+def guard(size: int) -> str:
+    """The C ::= C B* grammar of tests/n3/guard/simple-rec-guard.n3 over size tokens."""
+    facts = "[] a test:C; p:start 0; p:end 1.\n"
+    facts += "".join(
+        f"[] a test:B; p:start {i}; p:end {i + 1}.\n" for i in range(1, size)
+    )
+    rule = """{
+  [] a test:C; p:start ?a; p:end ?c.
+} log:impliedBy {
+  [] a test:C; p:start ?a; p:end ?b.
+  [] a test:B; p:start ?b; p:end ?c.
+}.
+"""
+    return PREFIXES + facts + rule
+
+
+def negation(size: int) -> str:
+    """Tasks closed over dependencies, with rules negating the derived facts."""
+    facts = "".join(f":t{i} a :Task; :dependsOn :t{i + 1}.\n" for i in range(size))
+    facts += "".join(f":t{i} :state :Done.\n" for i in range(0, size, 3))
+    rules = """{ ?t :dependsOn ?u } => { ?t :requires ?u }.
+{ ?t :requires ?u. ?u :requires ?v } => { ?t :requires ?v }.
+{ ?t a :Task. [] log:notIncludes { ?t :state :Done } } => { ?t :state :Open }.
+{ ?t :requires ?u. ?u :state :Open } => { ?t :blockedBy ?u }.
+{ ?t a :Task. [] log:notIncludes { ?t :blockedBy [] } } => { ?t :ready true }.
+"""
+    return PREFIXES + facts + rules
+
+
+def builtins(size: int) -> str:
+    """Numeric comparisons between all pairs of size measurements."""
+    facts = "".join(f":m{i} :value {(i * 7919) % (size * 10)}.\n" for i in range(size))
+    rules = """{ ?x :value ?a. ?y :value ?b. ?a math:lessThan ?b } => { ?x :below ?y }.
+{ ?x :value ?a. ?a math:greaterThan 100. ?a math:notGreaterThan 1000 }
+    => { ?x :inRange true }.
+"""
+    return PREFIXES + facts + rules
+
+
+def strata(size: int) -> str:
+    """A wide rule graph of size layers of size rules, each layer its own stratum."""
+    facts = "".join(f":e{i} :p0_{i} :v{i}.\n" for i in range(size))
+    rules = "".join(
+        f"{{ ?x :p{layer}_{i} ?y }} => {{ ?x :p{layer + 1}_{(i + 1) % size} ?y }}.\n"
+        for layer in range(size)
+        for i in range(size)
+    )
+    return PREFIXES + facts + rules
+
+
+WORKLOADS: dict[str, Callable[[int], str]] = {
+    "chain": chain,
+    "tree": tree,
+    "guard": guard,
+    "negation": negation,
+    "builtins": builtins,
+    "strata": strata,
+}
@@ -1,14 +1,22 @@
 import logging
 from collections.abc import Iterable, Iterator
-from hashlib import sha256
 from typing import cast
 
 from rdflib import BNode, Graph, Literal, URIRef, Variable
-from rdflib.collection import Collection
 from rdflib.namespace import RDF
 from rdflib.term import Node
 
+from knom import skolem
 from knom.builtins import BUILTINS, STRING, LOG
+from knom.join import run_batch
+from knom.plan import (
+    RulePlan,
+    compile_body,
+    compile_head,
+    compile_rules,
+    run_plan,
+)
+from knom.statistics import Statistics
 from knom.typing import Bindings, Mask, Triple
 from knom.util import get_body, get_head, print_triple
 
@@ -39,8 +47,7 @@ def bind_node(
     elif isinstance(head_node, Graph):
         if not isinstance(body_node, Graph):
             return
-        head = set(head_node)
-        yield from _match_rule(head.pop(), head, cast(Graph, body_node), bindings)
+        yield from match_rule(head_node, cast(Graph, body_node), bindings)
     else:
         raise TypeError
 
@@ -94,85 +101,28 @@ def head_sort_key(
         po == o,
         sum(1 if node in bindings else 0 for node in clause),
     )
-    logger.debug("key %s %s", print_triple(clause), key)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("key %s %s", print_triple(clause), key)
     return key
 
 
-def get_next_head(
-    prev_clause: Triple | tuple[None, None, None], head: Graph, bindings: Bindings
-) -> tuple:
-    # TODO: fix hex char range handling (builtins results are used in other builtins)
-    if len(head) == 0:
-        return None, set()
-    # TODO: there is still varying performance from run to run, investigate
-    next_head = max(
-        head, key=lambda triple: head_sort_key(prev_clause, triple, bindings)
-    )
-    if next_head:
-        logger.debug("head clause: %s, bindings %s", next_head, bindings)
-    remaining = Graph()
-    for triple in head:
-        if triple != next_head:
-            remaining.add(triple)
-    return next_head, remaining
-
-
-def _match_rule(
-    head_clause: Triple, head: Graph, facts: Graph, bindings: Bindings
-) -> Iterator[Bindings]:
-    logger.debug("match_rule")
-    if head_clause is None:
-        yield bindings
-    else:
-        s, p, o = head_clause
-        if p in BUILTINS:
-            assert isinstance(p, URIRef)
-            col = list(Collection(head, s))
-            if len(col) > 0:
-                ln = s
-                while True:
-                    found = False
-                    for triple in head.triples((ln, RDF.first, None)):
-                        head.remove(triple)
-                        found = True
-                    if not found:
-                        break
-                    for triple in head.triples((ln, RDF.rest, None)):
-                        ln = triple[2]
-                        head.remove(triple)
-                        found = True
-                    if not found:
-                        break
-                s = col
-            # TODO: copy bindings on update only
-            for binding in BUILTINS[p](s, o, bindings.copy(), facts):
-                next_head, remaining = get_next_head(head_clause, head, bindings)
-                yield from _match_rule(next_head, remaining, facts, binding)
-        else:
-            mask_ = mask(head_clause, bindings)
-            triples = facts.triples(mask_)
-            for fact in triples:
-                for binding in bind(head_clause, fact, bindings):
-                    next_head, remaining = get_next_head(head_clause, head, bindings)
-                    yield from _match_rule(next_head, remaining, facts, binding)
-
-
 def match_rule(
-    head: Graph, facts: Graph, bindings: Bindings = {}
+    head: Iterable[Triple],
+    facts: Graph,
+    bindings: Bindings | None = None,
+    statistics: Statistics | None = None,
+    batch: bool = False,
 ) -> Iterator[Bindings]:
-    next_head, remaining = get_next_head((None, None, None), head, bindings)
-    return _match_rule(next_head, remaining, facts, bindings)
+    if bindings is None:
+        bindings = {}
+    plan = compile_head(head, bindings, statistics=statistics)
+    if batch:
+        return run_batch(plan, facts, bindings)
+    return run_plan(plan, facts, bindings)
 
 
 def instantiate_bnodes(body: Graph, bindings: Bindings) -> None:
-    identifiers = [f"{node}:{binding}" for node, binding in sorted(bindings.items())]
-    base_path = "-".join(identifiers)
-    for triple in body:
-        for node in triple:
-            if isinstance(node, BNode) and node not in bindings:
-                path = f"{base_path}-{node}"
-                id_ = sha256(path.encode("utf-8")).hexdigest()
-                bindings[node] = BNode(id_)
+    bindings.update(skolem.bnode_names(body, bindings))
 
 
 def assign_node(node: Node, bindings: Bindings) -> Node:
@@ -194,7 +144,9 @@ def assign(triple: Triple, bindings: Bindings) -> Triple:
     )
 
 
-def fire_rule(rule: Triple, bindings: Bindings) -> Iterator[Triple]:
+def fire_rule(
+    rule: Triple, bindings: Bindings, plan: RulePlan | None = None
+) -> Iterator[Triple]:
     body = get_body(rule)
     if isinstance(body, Variable):
         g = bindings[body]
@@ -203,26 +155,53 @@ def fire_rule(rule: Triple, bindings: Bindings) -> Iterator[Triple]:
             yield triple
     else:
         assert isinstance(body, Graph)
-        instantiate_bnodes(body, bindings)
-        for triple in body:
-            yield assign(triple, bindings)
+        conclusion = compile_body(body) if plan is None else plan.conclusion
+        assert conclusion is not None
+        yield from conclusion.fire(bindings, conclusion.names.of(bindings))
 
 
-def single_rule(facts: Graph, rule: Triple) -> Iterator[Triple]:
+def single_rule(
+    facts: Graph, rule: Triple, plan: RulePlan | None = None
+) -> Iterator[Triple]:
     logger.debug("single_rule")
     head = get_head(rule)
+    if plan is None:
+        plan = RulePlan(rule)
     if isinstance(head, Variable | BNode):
         for fact in facts:
             g = Graph()
             g.add(fact)
             bindings = {head: g}
-            yield from fire_rule(rule, bindings)
+            yield from fire_rule(rule, bindings, plan)
     else:
-        assert isinstance(head, Graph)
-        for bindings in match_rule(head, facts):
-            yield from fire_rule(rule, bindings)
+        for bindings in plan.match(facts):
+            yield from fire_rule(rule, bindings, plan)
 
 
-def single_pass(facts: Graph, rules: Iterable[Triple]) -> Iterator[Triple]:
-    for rule in rules:
-        yield from single_rule(facts, rule)
+def delta_rule(
+    facts: Graph, delta: Graph, rule: Triple, plan: RulePlan | None = None
+) -> Iterator[Triple]:
+    """Fire only those matches of the rule that use at least one delta triple.
+
+    Each premise clause in turn is joined against `delta`, the rest of the
+    premise against `facts`, which must already include `delta`.
+    """
+    logger.debug("delta_rule")
+    head = get_head(rule)
+    if isinstance(head, Variable | BNode):
+        yield from single_rule(delta, rule, plan)
+        return
+    if plan is None:
+        plan = RulePlan(rule)
+    for bindings in plan.match_delta(facts, delta):
+        yield from fire_rule(rule, bindings, plan)
+
+
+def single_pass(
+    facts: Graph,
+    rules: Iterable[Triple],
+    batch: bool = False,
+) -> Iterator[Triple]:
+    plans = compile_rules(rules, Statistics.of(facts), batch)
+    for rule, plan in plans.items():
+        yield from single_rule(facts, rule, plan)
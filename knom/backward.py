@@ -0,0 +1,333 @@
+"""Goal-directed evaluation: proving triple patterns top-down over the rules.
+
+Subgoals are tabled by their pattern, so that recursive rules terminate and
+answers are shared between the subgoals asking for the same pattern.
+"""
+import logging
+from collections.abc import Iterable, Iterator
+from typing import Any
+
+from rdflib import BNode, Graph, Variable
+from rdflib.store import Store
+from rdflib.term import Node
+
+from knom import bind, fire_rule, mask, match_rule
+from knom.plan import (
+    BuiltinStep,
+    Step,
+    compile_head,
+    compile_rules,
+    get_plan,
+    variables,
+)
+from knom.stratified import (
+    NEGATION_PREDICATE,
+    SCOPED_BUILTINS,
+    get_rules_dependencies,
+    rule_method,
+    single_rule,
+    stratified,
+    stratify_rules,
+)
+from knom.typing import Bindings, Mask, Rule, RulesDependencies, Triple
+from knom.util import get_body, get_head
+
+logger = logging.getLogger(__name__)
+
+# A pattern and the positions that may hold blank nodes produced by rules,
+# only blank nodes of the premise depend on those (see node_depends)
+Goal = tuple[Mask, tuple[bool, bool, bool]]
+
+ANY = (True, True, True)
+
+
+class GoalStore(Store):
+    """Read-only store answering triple patterns with a prover."""
+
+    def __init__(self, prover: "Prover") -> None:
+        super().__init__()
+        self.prover = prover
+
+    def triples(
+        self, triple_pattern: Mask, context: Any = None  # noqa: ANN401, ARG002
+    ) -> Iterator[tuple[Triple, Iterator]]:
+        for triple in self.prover.solve(triple_pattern):
+            yield triple, iter(())
+
+    def __len__(self, context: Any = None) -> int:  # noqa: ANN401
+        return len(self.prover.solve((None, None, None)))
+
+
+def _producible(clause: Triple, goal: Goal) -> Bindings | None:
+    """Return the bindings making the conclusion clause match the goal, if it can."""
+    pattern, accepts = goal
+    bindings: Bindings = {}
+    for node, value, accept in zip(clause, pattern, accepts, strict=True):
+        if isinstance(node, BNode):
+            # Conclusion blank nodes are instantiated as fresh ones
+            if not accept or not isinstance(value, BNode | None):
+                return None
+        elif value is None:
+            continue
+        elif isinstance(node, Variable):
+            if bindings.setdefault(node, value) != value:
+                return None
+        elif isinstance(node, Graph) or node != value:
+            return None
+    return bindings
+
+
+def _matches(triple: Triple, goal: Mask) -> bool:
+    return all(
+        value is None or node == value for node, value in zip(triple, goal, strict=True)
+    )
+
+
+class Prover:
+    """Tabled top-down prover of triple patterns over facts and rules.
+
+    Tables of answers persist between queries, the facts and rules must not
+    change in the meantime.
+    """
+
+    def __init__(self, facts: Graph, rules: Graph) -> None:
+        self.facts = facts
+        self.rules = rules
+        self.document = Graph(
+            store=GoalStore(self), namespace_manager=facts.namespace_manager
+        )
+        # Conclusion clauses by predicate, None for variable predicates
+        self.producers: dict[Node | None, list[tuple[Rule, Triple | Variable]]] = {}
+        # Rules evaluated over the closure of the other rules, like the forward
+        # engine does: negative ones, ones with builtins consulting the whole
+        # document, recursive ones producing blank nodes, which are evaluated
+        # with guards as they would not terminate otherwise, and ones whose
+        # premise is a variable. Those recursive through their stratum, or
+        # without a premise formula, are evaluated forward with the stratum
+        self.isolated: set[Rule] = set()
+        self.forward: dict[Rule, tuple[Rule, ...]] = {}
+        rules_dependencies = get_rules_dependencies(rules)
+        strata: Iterable[list[Rule]] = stratify_rules(rules, rules_dependencies)  # type: ignore[assignment]
+        for stratum in strata:
+            for rule in stratum:
+                self._analyse(rule, stratum, rules_dependencies)
+        self.plans = compile_rules(rules)
+        self.tables: dict[Goal, set[Triple]] = {}
+        self.complete: set[Goal] = set()
+        self._steps: dict[tuple[Rule, frozenset[Variable | BNode]], list[Step]] = {}
+        # Conclusions of each firing, named once for all rounds
+        self._fired: dict[tuple[Rule, frozenset], list[Triple]] = {}
+        self._visited: set[Goal] = set()
+        self._changed = False
+        self._completing: set[Goal] = set()
+        self._excluding: dict[tuple[Rule, ...], Prover] = {}
+        self._isolated: dict[tuple[Rule, Triple | Variable, Goal], set[Triple]] = {}
+        self._forward: dict[tuple[Rule, ...], set[Triple]] = {}
+
+    def _analyse(
+        self, rule: Rule, stratum: list[Rule], rules_dependencies: RulesDependencies
+    ) -> None:
+        head = get_head(rule)
+        body = get_body(rule)
+        scoped = isinstance(head, Graph) and any(
+            p in SCOPED_BUILTINS for _, p, _ in head
+        )
+        if (
+            not isinstance(head, Graph)
+            or scoped
+            or rule_method(rule, rules_dependencies) is not single_rule
+        ):
+            self.isolated.add(rule)
+            if (
+                not isinstance(head, Graph)
+                or len(stratum) > 1
+                or rule in rules_dependencies[rule]
+            ):
+                self.forward[rule] = tuple(stratum)
+        if not isinstance(body, Graph):
+            self.producers.setdefault(None, []).append((rule, body))
+            return
+        for clause in body:
+            p = None if isinstance(clause[1], Variable | BNode) else clause[1]
+            self.producers.setdefault(p, []).append((rule, clause))
+
+    def _producers(self, goal: Mask) -> Iterator[tuple[Rule, Triple | Variable]]:
+        if goal[1] is None:
+            for producers in self.producers.values():
+                yield from producers
+        else:
+            yield from self.producers.get(goal[1], ())
+            yield from self.producers.get(None, ())
+
+    def _premise_steps(
+        self, rule: Rule, bound: frozenset[Variable | BNode]
+    ) -> list[Step]:
+        key = (rule, bound)
+        if key not in self._steps:
+            head = get_head(rule)
+            assert isinstance(head, Graph)
+            steps = compile_head(head, bound).steps
+            # Negations are checked once everything else is bound
+            self._steps[key] = [
+                *(s for s in steps if s.clause[1] != NEGATION_PREDICATE),
+                *(s for s in steps if s.clause[1] == NEGATION_PREDICATE),
+            ]
+        return self._steps[key]
+
+    def _conjunction(
+        self, steps: list[Step], i: int, bindings: Bindings
+    ) -> Iterator[Bindings]:
+        if i == len(steps):
+            yield bindings
+            return
+        step = steps[i]
+        clause = step.clause
+        if isinstance(step, BuiltinStep):
+            for bindings_ in step.function(
+                step.subject, step.object, bindings, self.document
+            ):
+                yield from self._conjunction(steps, i + 1, bindings_)
+        elif clause[1] == NEGATION_PREDICATE:
+            if not self._includes(clause, bindings):
+                yield from self._conjunction(steps, i + 1, bindings)
+        else:
+            # The table may grow while its answers are consumed
+            accepts = tuple(isinstance(node, BNode) for node in clause)
+            for answer in list(self._answers((mask(clause, bindings), accepts))):  # type: ignore[arg-type]
+                for bindings_ in bind(clause, answer, bindings):
+                    yield from self._conjunction(steps, i + 1, bindings_)
+
+    def _includes(self, clause: Triple, bindings: Bindings) -> bool:
+        scope, _, formula = clause
+        assert isinstance(formula, Graph)
+        if isinstance(scope, Variable | BNode):
+            scope = bindings.get(scope, scope)
+        if isinstance(scope, Graph):
+            return next(iter(match_rule(formula, scope, bindings)), None) is not None
+        # Negation as failure needs the complete answers of the formula
+        steps = compile_head(formula, bindings).steps
+        return (
+            len(self._fixpoint(lambda: self._conjunction(steps, 0, bindings), None)) > 0
+        )
+
+    def _without(self, excluded: tuple[Rule, ...]) -> "Prover":
+        if excluded not in self._excluding:
+            rules = Graph()
+            for other in self.rules:
+                if other not in excluded:
+                    rules.add(other)
+            self._excluding[excluded] = Prover(self.facts, rules)
+        return self._excluding[excluded]
+
+    def _fire(
+        self, rule: Rule, clause: Triple | Variable, goal: Goal
+    ) -> Iterator[Triple]:
+        """Yield the conclusions of the rule that may answer the goal.
+
+        Firing again on the same bindings concludes the same triples, so that
+        blank nodes for unbound conclusion variables do not grow the tables.
+        """
+        head = get_head(rule)
+        assert isinstance(head, Graph)
+        if isinstance(clause, tuple):
+            bindings = _producible(clause, goal)
+            if bindings is None:
+                return
+            premise = set(variables(head))
+            bindings = {
+                node: value for node, value in bindings.items() if node in premise
+            }
+        else:
+            bindings = {}
+        steps = self._premise_steps(rule, frozenset(bindings))
+        for bindings_ in self._conjunction(steps, 0, bindings):
+            key = (rule, frozenset(bindings_.items()))
+            if key not in self._fired:
+                plan = get_plan(rule, self.plans)
+                self._fired[key] = list(fire_rule(rule, bindings_, plan))
+            yield from self._fired[key]
+
+    def _isolated_answers(
+        self, rule: Rule, clause: Triple | Variable, goal: Goal
+    ) -> set[Triple]:
+        stratum = self.forward.get(rule)
+        if stratum is not None:
+            if stratum not in self._forward:
+                rules = Graph()
+                for other in stratum:
+                    rules.add(other)
+                self._forward[stratum] = set(
+                    stratified(self._without(stratum).document, rules)
+                )
+            return self._forward[stratum]
+        key = (rule, clause, goal)
+        if key not in self._isolated:
+            prover = self._without((rule,))
+            self._isolated[key] = set(
+                prover._fixpoint(lambda: prover._fire(rule, clause, goal), None)  # noqa: SLF001
+            )
+        return self._isolated[key]
+
+    def _answers(self, goal: Goal) -> set[Triple]:
+        """Return the answers of the goal, evaluating its table once per round."""
+        pattern = goal[0]
+        if goal not in self.tables:
+            self.tables[goal] = set(self.facts.triples(pattern))
+            self._changed = self._changed or len(self.tables[goal]) > 0
+        table = self.tables[goal]
+        if goal in self.complete or goal in self._visited:
+            return table
+        self._visited.add(goal)
+        for rule, clause in self._producers(pattern):
+            if rule in self.isolated:
+                conclusions: Iterable[Triple] = self._isolated_answers(
+                    rule, clause, goal
+                )
+            else:
+                conclusions = self._fire(rule, clause, goal)
+            for triple in conclusions:
+                if triple not in table and _matches(triple, pattern):
+                    table.add(triple)
+                    self._changed = True
+        return table
+
+    def _fixpoint(self, evaluate: Any, goal: Goal | None) -> list:  # noqa: ANN401
+        """Repeat the evaluation until no table grows, the tables are then complete."""
+        if goal is not None and goal in self._completing:
+            return list(self.tables.get(goal, ()))
+        outer = self._visited, self._changed
+        if goal is not None:
+            self._completing.add(goal)
+        changed = False
+        try:
+            while True:
+                self._visited = set()
+                self._changed = False
+                result = list(evaluate())
+                changed = changed or self._changed
+                if not self._changed:
+                    break
+            self.complete |= self._visited
+        finally:
+            if goal is not None:
+                self._completing.discard(goal)
+            self._visited, self._changed = outer[0], outer[1] or changed
+        return result
+
+    def solve(self, pattern: Mask) -> set[Triple]:
+        """Return the triples of the closure matching the pattern."""
+        goal = (pattern, ANY)
+        if goal in self.complete:
+            return self.tables[goal]
+        logger.debug("solving %s", pattern)
+        return set(self._fixpoint(lambda: self._answers(goal), goal))
+
+    def query(self, goal: Triple) -> Iterator[Bindings]:
+        """Yield the bindings of the goal's variables and blank nodes per answer."""
+        for answer in self.solve(mask(goal)):
+            yield from bind(goal, answer)
+
+
+def query(facts: Graph, rules: Graph, goal: Triple) -> Iterator[Bindings]:
+    """Prove the goal pattern top-down, without materializing the closure."""
+    return Prover(facts, rules).query(goal)
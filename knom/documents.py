@@ -0,0 +1,172 @@
+"""Reasoning over many fact documents with one rule set, analysed once.
+
+Each document gets its own closure, its inferred triples are written as
+N-Triples to an output file of its own. Documents are evaluated by forked
+worker processes sharing the compiled program, a failing document is
+reported and the others go on. Rules found in the documents are ignored.
+"""
+import logging
+import multiprocessing
+import os
+import time
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any
+
+from rdflib import Graph
+
+from knom import ntriples
+from knom.program import Program
+from knom.stratified import stratified_triples
+from knom.util import split_rules_and_facts
+
+logger = logging.getLogger(__name__)
+
+# Documents read as N-Triples, the others are parsed by rdflib from their extension
+NTRIPLES_SUFFIXES = (".nt", ".nq")
+DOCUMENT_SUFFIXES = (".n3", ".ttl", *NTRIPLES_SUFFIXES)
+
+# Documents sent to a worker at once
+CHUNK_SIZE = 16
+
+# State of the forked workers, set just before forking them
+_state: dict[str, Any] = {}
+
+
+class DocumentResult:
+    """Outcome of reasoning over one document."""
+
+    def __init__(self, document: Path, output: Path) -> None:
+        self.document = document
+        self.output = output
+        self.facts = 0
+        self.inferred = 0
+        self.load_seconds = 0.0
+        self.infer_seconds = 0.0
+        self.error: str | None = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "document": str(self.document),
+            "output": str(self.output) if self.ok else None,
+            "facts": self.facts,
+            "inferred": self.inferred,
+            "load_seconds": self.load_seconds,
+            "infer_seconds": self.infer_seconds,
+            "error": self.error,
+        }
+
+
+def documents_of(source: str | Path) -> list[tuple[Path, Path]]:
+    """Return the documents of a directory or a manifest, with their relative paths.
+
+    Manifests list a path per line, relative to the manifest, lines starting
+    with # are comments. Documents outside of the manifest's directory keep
+    their whole resolved path, so that their outputs stay apart.
+    """
+    source = Path(source)
+    if source.is_dir():
+        return [
+            (path, path.relative_to(source))
+            for path in sorted(source.rglob("*"))
+            if path.suffix in DOCUMENT_SUFFIXES and path.is_file()
+        ]
+    documents = []
+    for line in source.read_text().splitlines():
+        entry = line.strip()
+        if entry == "" or entry.startswith("#"):
+            continue
+        path = Path(entry)
+        relative = path
+        if path.is_absolute() or ".." in path.parts:
+            # Outputs stay in the output directory
+            resolved = (source.parent / path).resolve()
+            relative = resolved.relative_to(resolved.anchor)
+        documents.append((source.parent / path, relative))
+    return documents
+
+
+def _load(document: Path) -> Graph:
+    if document.suffix in NTRIPLES_SUFFIXES:
+        return ntriples.load(document)
+    _, facts = split_rules_and_facts(Graph().parse(document))
+    return facts
+
+
+def reason_document(
+    program: Program, document: Path, output: Path, semi_naive: bool = True
+) -> DocumentResult:
+    """Write the triples inferred from the facts of the document to the output file."""
+    result = DocumentResult(document, output)
+    try:
+        start = time.perf_counter()
+        facts = _load(document)
+        result.facts = len(facts)
+        result.load_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        output.parent.mkdir(parents=True, exist_ok=True)
+        with output.open("w", encoding="utf-8") as out:
+            triples = stratified_triples(
+                facts, program.rules, semi_naive, program.batch, program
+            )
+            result.inferred = ntriples.write(triples, out)
+        result.infer_seconds = time.perf_counter() - start
+    except Exception as e:
+        result.error = f"{type(e).__name__}: {e}"
+        output.unlink(missing_ok=True)
+        logger.debug("failed on %s", document, exc_info=True)
+    return result
+
+
+def _claims(
+    documents: Iterable[tuple[Path, Path]],
+) -> Iterator[tuple[Path, Path, bool]]:
+    """Tell for each document whether its output is its own or an earlier one's."""
+    claimed: set[str] = set()
+    for document, relative in documents:
+        key = os.path.normpath(relative)
+        yield document, relative, key not in claimed
+        claimed.add(key)
+
+
+def _reason(entry: tuple[Path, Path, bool]) -> DocumentResult:
+    document, relative, own = entry
+    output = _state["output"] / relative.with_name(relative.name + ".nt")
+    if not own:
+        result = DocumentResult(document, output)
+        result.error = f"output {output} is written for an earlier document"
+        return result
+    return reason_document(_state["program"], document, output, _state["semi_naive"])
+
+
+def reason_documents(
+    program: Program,
+    documents: Iterable[tuple[Path, Path]],
+    output: str | Path,
+    workers: int | None = None,
+    semi_naive: bool = True,
+) -> Iterator[DocumentResult]:
+    """Reason over each document, yielding their results in order.
+
+    Documents are given with their path relative to the output directory,
+    where their inferences go, the document name followed by `.nt`. Up to
+    `workers` processes are used (the CPU count by default). Documents
+    sharing the output of an earlier one fail.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    _state.update(program=program, output=Path(output), semi_naive=semi_naive)
+    try:
+        if workers <= 1 or "fork" not in multiprocessing.get_all_start_methods():
+            yield from map(_reason, _claims(documents))
+            return
+        context = multiprocessing.get_context("fork")
+        with ProcessPoolExecutor(workers, mp_context=context) as pool:
+            yield from pool.map(_reason, _claims(documents), chunksize=CHUNK_SIZE)
+    finally:
+        _state.clear()
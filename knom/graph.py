@@ -0,0 +1,43 @@
+from collections.abc import Iterator
+from typing import Any
+
+from rdflib import Graph
+from rdflib.store import Store
+
+from knom.typing import Mask, Triple
+
+
+class UnionStore(Store):
+    """Read-only store presenting several graphs as one, without copying.
+
+    Layers are expected to be disjoint, a triple present in several layers
+    is reported once per layer.
+    """
+
+    def __init__(self, layers: list[Graph]) -> None:
+        super().__init__()
+        self.layers = layers
+
+    def triples(
+        self, triple_pattern: Mask, context: Any = None  # noqa: ANN401, ARG002
+    ) -> Iterator[tuple[Triple, Iterator]]:
+        for layer in self.layers:
+            for triple in layer.triples(triple_pattern):
+                yield triple, iter(())
+
+    def __len__(self, context: Any = None) -> int:  # noqa: ANN401
+        return sum(len(layer) for layer in self.layers)
+
+    def add(self, *args: Any, **kwargs: Any) -> None:  # noqa: ANN401, ARG002
+        raise TypeError("union graphs are read-only")
+
+    def remove(self, *args: Any, **kwargs: Any) -> None:  # noqa: ANN401, ARG002
+        raise TypeError("union graphs are read-only")
+
+
+def union(*layers: Graph) -> Graph:
+    """Return a read-only graph over the layers, which stay live."""
+    return Graph(
+        store=UnionStore(list(layers)),
+        namespace_manager=layers[0].namespace_manager,
+    )
@@ -0,0 +1,106 @@
+import logging
+from collections.abc import Iterator
+
+from rdflib import Graph, Variable
+
+from knom import trace
+from knom.plan import (
+    BuiltinStep,
+    MatchStep,
+    NegationStep,
+    Plan,
+    Row,
+    call_step,
+    match_step,
+    negation_step,
+)
+from knom.typing import Bindings, Triple
+
+logger = logging.getLogger(__name__)
+
+# Fewer rows than this are joined by probing the facts once per row
+HASH_JOIN_MIN_ROWS = 16
+
+
+def _extend(step: MatchStep, row: Row, fact: Triple) -> Row | None:
+    new = row.copy()
+    clause = step.clause
+    for i, slot in enumerate(step.slots):
+        if slot is None:
+            continue
+        value = fact[i]
+        if isinstance(value, Variable):
+            return None
+        current = new[slot]
+        if current is None:
+            new[slot] = value
+        elif current != value and clause[i] != value:
+            return None
+    return new
+
+
+def _hash_join(step: MatchStep, rows: list[Row], facts: Graph) -> list[Row]:
+    # Positions of the clause variables bound in these rows form the join key
+    key_positions = [
+        i
+        for i, slot in enumerate(step.slots)
+        if slot is not None and rows[0][slot] is not None
+    ]
+    table: dict[tuple, list[Triple]] = {}
+    scanned = 0
+    for fact in facts.triples(step.terms):  # type: ignore[arg-type]
+        scanned += 1
+        table.setdefault(tuple(fact[i] for i in key_positions), []).append(fact)
+    logger.debug("hash join %i rows, %i keys", len(rows), len(table))
+    if trace.sinks:
+        trace.emit("step", clause=step.clause, scanned=scanned)
+
+    result = []
+    for row in rows:
+        key = tuple(row[step.slots[i]] for i in key_positions)  # type: ignore[index]
+        for fact in table.get(key, ()):
+            new = _extend(step, row, fact)
+            if new is not None:
+                result.append(new)
+    return result
+
+
+def _join(step: MatchStep, rows: list[Row], facts: Graph) -> list[Row]:
+    if len(step.nested) > 0 or len(rows) < HASH_JOIN_MIN_ROWS:
+        return [new for row in rows for new in match_step(step, row, facts)]
+    # Rows are grouped by which of the clause variables they have bound
+    groups: dict[tuple[bool, ...], list[Row]] = {}
+    for row in rows:
+        signature = tuple(
+            slot is not None and row[slot] is not None for slot in step.slots
+        )
+        groups.setdefault(signature, []).append(row)
+    result = []
+    for group in groups.values():
+        result.extend(_hash_join(step, group, facts))
+    return result
+
+
+def run_batch(
+    plan: Plan,
+    facts: Graph,
+    bindings: Bindings | None = None,
+    delta: Graph | None = None,
+) -> Iterator[Bindings]:
+    """Evaluate the plan a step at a time over all partial matches at once."""
+    rows = [plan.row({} if bindings is None else bindings)]
+    for step in plan.steps:
+        if isinstance(step, BuiltinStep):
+            rows = [new for row in rows for new in call_step(plan, step, row, facts)]
+        elif isinstance(step, NegationStep):
+            rows = [new for row in rows for new in negation_step(step, row, facts)]
+        else:
+            source = delta if step.delta else facts
+            assert source is not None
+            rows = _join(step, rows, source)
+        if len(rows) == 0:
+            break
+    if trace.sinks:
+        trace.emit("matched", bindings=len(rows))
+    for row in rows:
+        yield plan.bindings(row)
@@ -0,0 +1,266 @@
+"""Magic-sets rewriting: restricting forward evaluation to the facts a query needs.
+
+Each rule producing a queried predicate is guarded by a magic clause holding
+the values the query binds, subject and object, and magic rules propagate
+those values from left to right through the premises, in the order of their
+plans. Rules that can not be restricted (negative ones, ones consulting the
+whole document, ones concluding nodes their premise does not bind or
+matching any predicate) are kept as they are, and everything their premise
+may match is fully demanded.
+"""
+import logging
+from collections.abc import Collection, Iterable
+
+from rdflib import BNode, Graph, Literal, URIRef, Variable
+from rdflib.graph import QuotedGraph
+from rdflib.namespace import RDF
+from rdflib.term import Node
+
+from knom.builtins import BUILTINS
+from knom.graph import union
+from knom.plan import BuiltinStep, compile_head, variables
+from knom.store import dictionary_of, encoded
+from knom.stratified import (
+    SCOPED_BUILTINS,
+    concludes_fresh_nodes,
+    is_negative,
+    premise_predicates,
+    stratified,
+)
+from knom.typing import Mask, Rule, Triple
+from knom.util import LOG, get_body, get_head
+
+logger = logging.getLogger(__name__)
+
+MAGIC = "urn:x-knom:magic:"
+# Placeholder of the unbound positions of magic facts
+NIL = URIRef(MAGIC + "nil")
+
+# Whether the subject and the object are bound, like "bf"
+Adornment = str
+Demand = tuple[Node, Adornment]
+
+
+def magic_predicate(predicate: Node, adornment: Adornment) -> URIRef:
+    return URIRef(f"{MAGIC}{adornment}:{predicate}")
+
+
+def is_magic(triple: Triple) -> bool:
+    return isinstance(triple[1], URIRef) and triple[1].startswith(MAGIC)
+
+
+def _is_constant(node: Node | None) -> bool:
+    return isinstance(node, URIRef | Literal)
+
+
+def _adornment(clause: Triple | Mask, bound: Collection[Node] = ()) -> Adornment:
+    return "".join(
+        "b" if _is_constant(node) or node in bound else "f"
+        for node in (clause[0], clause[2])
+    )
+
+
+def _magic_clause(clause: Triple | Mask, adornment: Adornment) -> Triple:
+    s, p, o = clause
+    assert p is not None
+    return (
+        s if adornment[0] == "b" else NIL,
+        magic_predicate(p, adornment),
+        o if adornment[1] == "b" else NIL,
+    )  # type: ignore[return-value]
+
+
+def _rule(premise: Iterable[Triple], conclusion: Iterable[Triple] | Graph) -> Rule:
+    g = Graph()  # Just to create some store implicitly
+    head = QuotedGraph(store=g.store, identifier=BNode())
+    for triple in premise:
+        head.add(triple)
+    if not isinstance(conclusion, Graph):
+        body = QuotedGraph(store=g.store, identifier=BNode())
+        for triple in conclusion:
+            body.add(triple)
+        conclusion = body
+    return (head, LOG.implies, conclusion)  # type: ignore[return-value]
+
+
+def _rename(clause: Triple) -> Triple:
+    """Turn premise blank nodes into variables, so that magic rules depend on them."""
+    s, p, o = (
+        Variable(f"magic_{node}") if isinstance(node, BNode) else node
+        for node in clause
+    )
+    return s, p, o
+
+
+def _list_triples(head: Graph, node: Node | None) -> Iterable[Triple]:
+    while node is not None and (node, RDF.first, None) in head:
+        yield from head.triples((node, None, None))
+        node = head.value(node, RDF.rest)
+
+
+def _restrictable(rule: Rule) -> bool:
+    head = get_head(rule)
+    body = get_body(rule)
+    if not isinstance(head, Graph) or not isinstance(body, Graph) or is_negative(rule):
+        return False
+    if concludes_fresh_nodes(rule):
+        # Copies of the rule would each name the nodes anew
+        return False
+    return all(
+        p not in SCOPED_BUILTINS and (p in BUILTINS or _is_constant(p))
+        for _, p, _ in head
+    )
+
+
+class _Rewriter:
+    def __init__(self, rules: Graph) -> None:
+        self.producers: dict[Node, list[Rule]] = {}
+        for rule in rules:
+            body = get_body(rule)
+            assert isinstance(body, Graph)
+            for _, p, _ in body:
+                self.producers.setdefault(p, []).append(rule)  # type: ignore[arg-type]
+        self.rules = Graph()
+        self.seeds: set[Triple] = set()
+        self.demanded: set[Demand] = set()
+        self.pending: list[Demand] = []
+        self.kept: set[Rule] = set()
+        self.whole = False
+
+    def demand(self, predicate: Node, adornment: Adornment) -> None:
+        if predicate in self.producers and (predicate, adornment) not in self.demanded:
+            self.demanded.add((predicate, adornment))
+            self.pending.append((predicate, adornment))
+
+    def demand_all(self, predicate: Node | None) -> None:
+        if predicate is None:
+            if not self.whole:
+                self.whole = True
+                for p in self.producers:
+                    self.demand_all(p)
+        elif predicate in self.producers and (predicate, "ff") not in self.demanded:
+            self.seeds.add((NIL, magic_predicate(predicate, "ff"), NIL))
+            self.demand(predicate, "ff")
+
+    def keep(self, rule: Rule) -> None:
+        if rule in self.kept:
+            return
+        self.kept.add(rule)
+        self.rules.add(rule)
+        head = get_head(rule)
+        if not isinstance(head, Graph):
+            self.demand_all(None)
+            return
+        for p in premise_predicates(head):
+            self.demand_all(p)
+
+    def rewrite(self, rule: Rule, conclusion: Triple, adornment: Adornment) -> None:
+        head = get_head(rule)
+        assert isinstance(head, Graph)
+        premise = set(variables(head))
+        guard = _magic_clause(conclusion, adornment)
+        if not set(variables(guard)) <= premise or any(
+            isinstance(node, Graph) for node in guard
+        ):
+            # Binding the conclusion would change the rule
+            self.keep(rule)
+            return
+        # Builtins may not accept their results bound beforehand
+        results = {
+            node
+            for triple in head
+            if triple[1] in BUILTINS
+            for node in variables(triple)
+        }
+        results.update(
+            node for triple in self._lists(head) for node in variables(triple)
+        )
+        guard = tuple(  # type: ignore[assignment]
+            Variable(f"magic_{i}") if node in results else node
+            for i, node in enumerate(guard)
+        )
+        bound = set(variables(guard)) & premise
+        self.rules.add(_rule([*head, guard], get_body(rule)))  # type: ignore[arg-type]
+
+        # Sideways information passing, in the order of the premise plan
+        passed: list[Triple] = [guard]
+        for step in compile_head(head, bound).steps:
+            clause = step.clause
+            if isinstance(step, BuiltinStep):
+                passed.extend(_list_triples(head, clause[0]))
+            elif clause[1] in self.producers:
+                adornment_ = _adornment(clause, bound)
+                self.demand(clause[1], adornment_)
+                magic = _magic_clause(_rename(clause), adornment_)
+                self.rules.add(_rule(passed, [magic]))
+            passed.append(_rename(clause))
+            bound.update(variables(clause))
+
+    @staticmethod
+    def _lists(head: Graph) -> Iterable[Triple]:
+        for s, p, _ in head:
+            if p in BUILTINS:
+                yield from _list_triples(head, s)
+
+    def run(self) -> None:
+        while len(self.pending) > 0:
+            predicate, adornment = self.pending.pop()
+            for rule in self.producers[predicate]:
+                if rule in self.kept:
+                    continue
+                if not _restrictable(rule):
+                    self.keep(rule)
+                    continue
+                body = get_body(rule)
+                assert isinstance(body, Graph)
+                for conclusion in body:
+                    if conclusion[1] == predicate:
+                        self.rewrite(rule, conclusion, adornment)
+
+
+def magic_rules(rules: Graph, goal: Triple | Mask) -> tuple[Graph, Graph]:
+    """Rewrite the rules for the goal pattern, returning them and the seed magic facts.
+
+    Unbound positions of the goal are None, variables or blank nodes. Rules
+    are returned as they are when the goal predicate is unbound or some
+    conclusion has an unbound predicate.
+    """
+    seeds = Graph()
+    predicate = goal[1]
+    unknown = any(
+        not isinstance(body, Graph) or any(not _is_constant(p) for _, p, _ in body)
+        for body in map(get_body, rules)
+    )
+    if not _is_constant(predicate) or unknown:
+        logger.debug("no magic rewriting for %s", goal)
+        return rules, seeds
+    rewriter = _Rewriter(rules)
+    adornment = _adornment(goal)
+    seeds.add(_magic_clause(goal, adornment))
+    rewriter.demand(predicate, adornment)  # type: ignore[arg-type]
+    rewriter.run()
+    for triple in rewriter.seeds:
+        seeds.add(triple)
+    logger.debug("rewrote %i rules into %i", len(rules), len(rewriter.rules))
+    return rewriter.rules, seeds
+
+
+def magic_stratified(
+    facts: Graph,
+    rules: Graph,
+    goal: Triple | Mask,
+    semi_naive: bool = True,
+    batch: bool = False,
+) -> Graph:
+    """Infer what the goal pattern needs with the rewritten rules.
+
+    The triples matching the goal are the ones `stratified` infers, the
+    other inferred triples are only a part of its inferences.
+    """
+    rewritten, seeds = magic_rules(rules, goal)
+    closure = union(facts, encoded(seeds, dictionary_of(facts)))
+    g = Graph(namespace_manager=facts.namespace_manager)
+    for triple in stratified(closure, rewritten, semi_naive, batch):
+        if not is_magic(triple):
+            g.add(triple)
+    return g
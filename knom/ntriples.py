@@ -0,0 +1,218 @@
+"""N-Triples and N-Quads, read and written a line at a time.
+
+Reading goes over a memory-mapped file straight into an encoded store,
+without building an intermediate graph. Graph names of quads are ignored,
+every triple is a fact of the document, and blank node labels are scoped
+to the document read.
+"""
+import logging
+import mmap
+import re
+from collections.abc import Iterable, Iterator
+from pathlib import Path
+from typing import TextIO
+
+from rdflib import BNode, Graph, Literal, URIRef
+from rdflib.term import Node
+
+from knom.store import EncodedStore, encoded
+from knom.typing import Triple
+
+logger = logging.getLogger(__name__)
+
+_ESCAPES = str.maketrans({
+    "\\": "\\\\",
+    '"': '\\"',
+    "\n": "\\n",
+    "\r": "\\r",
+    "\t": "\\t",
+    "\b": "\\b",
+    "\f": "\\f",
+})
+
+
+# A term, then its IRI, blank node label, lexical form, language and datatype
+_TERM = (
+    r'(<([^>]*)>|_:((?:[^\s.]|\.(?=[^\s.]))+)'
+    r'|"((?:[^"\\]|\\.)*)"(?:@([A-Za-z0-9-]+)|\^\^<([^>]*)>)?)'
+)
+_STATEMENT = re.compile(
+    rf"\s*{_TERM}\s*{_TERM}\s*{_TERM}\s*(?:{_TERM}\s*)?\.\s*(?:#.*)?"
+)
+_GROUPS = 6
+_TERM_PATTERN = re.compile(_TERM)
+_ESCAPE = re.compile(r"\\(u[0-9A-Fa-f]{4}|U[0-9A-Fa-f]{8}|.)")
+_UNESCAPES = {
+    "t": "\t",
+    "b": "\b",
+    "n": "\n",
+    "r": "\r",
+    "f": "\f",
+    '"': '"',
+    "'": "'",
+    "\\": "\\",
+}
+
+
+def _unescape(match: re.Match) -> str:
+    escape = match.group(1)
+    if len(escape) > 1:
+        return chr(int(escape[1:], 16))
+    return _UNESCAPES[escape]
+
+
+def _node(  # noqa: PLR0913
+    bnodes: dict[str, BNode],
+    iri: str | None,
+    label: str | None,
+    lexical: str,
+    language: str | None,
+    datatype: str | None,
+) -> Node:
+    if iri is not None:
+        return URIRef(_ESCAPE.sub(_unescape, iri) if "\\" in iri else iri)
+    if label is not None:
+        node = bnodes.get(label)
+        if node is None:
+            node = bnodes[label] = BNode()
+        return node
+    if "\\" in lexical:
+        lexical = _ESCAPE.sub(_unescape, lexical)
+    if datatype is not None:
+        return Literal(lexical, datatype=URIRef(datatype))
+    return Literal(lexical, lang=language)
+
+
+class _Lines:
+    """Lines of a memory-mapped file, decoded one at a time."""
+
+    def __init__(self, path: str | Path) -> None:
+        self.path = path
+
+    def __iter__(self) -> Iterator[str]:
+        with Path(self.path).open("rb") as f:
+            if f.seek(0, 2) == 0:
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                start = 0
+                size = len(buffer)
+                while start < size:
+                    end = buffer.find(b"\n", start)
+                    if end == -1:
+                        end = size
+                    yield buffer[start:end].decode("utf-8")
+                    start = end + 1
+
+
+def _statements(lines: Iterable[str], source: str | Path) -> Iterator[tuple]:
+    """Yield the groups of each statement, `_GROUPS` per term."""
+    for number, text in enumerate(lines, 1):
+        match = _STATEMENT.fullmatch(text)
+        if match is None:
+            stripped = text.strip()
+            if stripped == "" or stripped.startswith("#"):
+                continue
+            raise ValueError(f"{source}:{number}: invalid N-Triples statement")
+        yield match.groups()
+
+
+def read(path: str | Path) -> Iterator[Triple]:
+    """Yield the triples of an N-Triples or N-Quads file."""
+    bnodes: dict[str, BNode] = {}
+    for groups in _statements(_Lines(path), path):
+        yield tuple(  # type: ignore[misc]
+            _node(bnodes, *groups[i + 1 : i + _GROUPS])
+            for i in range(0, 3 * _GROUPS, _GROUPS)
+        )
+
+
+def _load(statements: Iterable[tuple], into: Graph | None) -> Graph:
+    if into is None:
+        into = encoded()
+    store = into.store
+    if not isinstance(store, EncodedStore):
+        raise TypeError("facts are loaded into encoded graphs only")
+    encode = store.dictionary.encode
+    ids: dict[str, int] = {}
+    bnodes: dict[str, BNode] = {}
+    added = 0
+    for groups in statements:
+        triple = []
+        for i in range(0, 3 * _GROUPS, _GROUPS):
+            id_ = ids.get(groups[i])
+            if id_ is None:
+                id_ = ids[groups[i]] = encode(
+                    _node(bnodes, *groups[i + 1 : i + _GROUPS])
+                )
+            triple.append(id_)
+        added += store.add_ids(*triple)
+    logger.debug("loaded %i triples", added)
+    return into
+
+
+def load(path: str | Path, into: Graph | None = None) -> Graph:
+    """Add the triples of an N-Triples or N-Quads file to an encoded graph.
+
+    The graph is a new one by default. Terms are parsed once per distinct
+    spelling and the triples added by their ids. Blank node labels are
+    scoped to the file, each gets a fresh blank node.
+    """
+    return _load(_statements(_Lines(path), path), into)
+
+
+def loads(data: str, into: Graph | None = None) -> Graph:
+    """Add the triples of an N-Triples or N-Quads document to an encoded graph.
+
+    Like `load`, blank node labels are scoped to the document.
+    """
+    return _load(_statements(data.splitlines(), "<string>"), into)
+
+
+def parse_term(text: str) -> Node:
+    """Parse a term written as N-Triples, blank nodes keeping their label."""
+    match = _TERM_PATTERN.fullmatch(text.strip())
+    if match is None:
+        raise ValueError(f"invalid N-Triples term {text!r}")
+    _, iri, label, lexical, language, datatype = match.groups()
+    if label is not None:
+        return BNode(label)
+    return _node({}, iri, label, lexical, language, datatype)
+
+
+def term(node: Node) -> str:
+    """Render a term as N-Triples."""
+    if isinstance(node, Literal):
+        lexical = f'"{str(node).translate(_ESCAPES)}"'
+        if node.language is not None:
+            return f"{lexical}@{node.language}"
+        if node.datatype is not None:
+            return f"{lexical}^^<{node.datatype}>"
+        return lexical
+    if isinstance(node, URIRef | BNode):
+        return node.n3()
+    raise TypeError(f"{node!r} can not be written as N-Triples")
+
+
+def line(triple: Triple, graph: URIRef | None = None) -> str:
+    """Render a triple as an N-Triples line, or an N-Quads one in the graph."""
+    terms = [term(node) for node in triple]
+    if graph is not None:
+        terms.append(term(graph))
+    return " ".join(terms) + " .\n"
+
+
+def write(triples: Iterable[Triple], out: TextIO, graph: URIRef | None = None) -> int:
+    """Write the triples as they come, returning how many were written.
+
+    Triples holding formulas have no N-Triples form and are skipped.
+    """
+    written = skipped = 0
+    for triple in triples:
+        if any(isinstance(node, Graph) for node in triple):
+            skipped += 1
+            continue
+        out.write(line(triple, graph))
+        written += 1
+    if skipped > 0:
+        logger.warning("skipped %i triples holding formulas", skipped)
+    return written
@@ -0,0 +1,319 @@
+"""Evaluation spread over worker processes.
+
+Workers are forked, so that they inherit the closure instead of receiving
+it, and send back the triples they infer. Platforms without fork evaluate
+in the calling process. Trace events of the workers are not collected.
+"""
+import logging
+import multiprocessing
+import os
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Any
+
+from rdflib import BNode, Graph, Variable
+from rdflib.term import Node
+
+from knom import fire_rule, single_rule, trace
+from knom.graph import union
+from knom.join import run_batch
+from knom.plan import MatchStep, Plan, RulePlan, compile_rules, get_plan, run_plan
+from knom.program import Program
+from knom.statistics import Statistics
+from knom.store import dictionary_of, encoded
+from knom.stratified import evaluate_stratum, premise_predicates, rule_method
+from knom.typing import Rule, Triple
+from knom.util import get_body, get_head
+
+logger = logging.getLogger(__name__)
+
+# State of the forked workers, set just before forking them
+_state: dict[str, Any] = {}
+
+
+def _reads(rule: Rule) -> set[Node | None]:
+    """Return the predicates the premise may match, None for any."""
+    head = get_head(rule)
+    if not isinstance(head, Graph):
+        return {None}
+    return set(premise_predicates(head))
+
+
+def _produces(rule: Rule) -> set[Node | None]:
+    """Return the predicates of the conclusions, None for any."""
+    body = get_body(rule)
+    if not isinstance(body, Graph):
+        return {None}
+    return {None if isinstance(p, Variable | BNode) else p for _, p, _ in body}
+
+
+def strata_dependencies(all_strata: list[list[Rule]]) -> list[set[int]]:
+    """Return for each stratum the earlier strata producing something it may match.
+
+    Predicates are compared rather than clauses, so that a stratum sees
+    everything the earlier strata would have given it in sequence.
+    """
+    reads = [set().union(*(_reads(rule) for rule in strata)) for strata in all_strata]
+    produces = [
+        set().union(*(_produces(rule) for rule in strata)) for strata in all_strata
+    ]
+    dependencies: list[set[int]] = []
+    for i in range(len(all_strata)):
+        dependencies.append(
+            {
+                j
+                for j in range(i)
+                if None in reads[i]
+                or None in produces[j]
+                or len(reads[i] & produces[j]) > 0
+            }
+        )
+    return dependencies
+
+
+def waves(dependencies: list[set[int]]) -> list[list[int]]:
+    """Group the strata in waves, each depending only on earlier waves."""
+    level: list[int] = []
+    for deps in dependencies:
+        level.append(1 + max((level[j] for j in deps), default=-1))
+    grouped: list[list[int]] = [[] for _ in range(max(level, default=-1) + 1)]
+    for i, wave in enumerate(level):
+        grouped[wave].append(i)
+    return grouped
+
+
+def _can_fork() -> bool:
+    return "fork" in multiprocessing.get_all_start_methods()
+
+
+def _driving_plan(rule_plan: RulePlan) -> Plan | None:
+    """Return the plan matching the first clause of the premise plan against a delta."""
+    if rule_plan.premise is None or len(rule_plan.premise.steps) == 0:
+        return None
+    first = rule_plan.premise.steps[0]
+    if not isinstance(first, MatchStep):
+        return None
+    for plan in rule_plan.deltas:
+        if plan.steps[0].clause == first.clause:
+            return plan
+    return None
+
+
+def _fire_shard(shard: int) -> list[Triple]:
+    facts: Graph = _state["facts"]
+    rule: Rule = _state["rule"]
+    rule_plan: RulePlan = _state["rule_plan"]
+    plan: Plan = _state["plan"]
+    shards: int = _state["shards"]
+    step = plan.steps[0]
+    assert isinstance(step, MatchStep)
+    # Forked workers iterate the same facts in the same order
+    candidates = islice(facts.triples(step.terms), shard, None, shards)  # type: ignore[arg-type]
+    delta = encoded(candidates, dictionary_of(facts))
+    run = run_batch if rule_plan.batch else run_plan
+    return [
+        triple
+        for bindings in run(plan, facts, delta=delta)
+        for triple in fire_rule(rule, bindings, rule_plan)
+    ]
+
+
+def sharded_rule(
+    facts: Graph,
+    rule: Rule,
+    plan: RulePlan | None = None,
+    shards: int | None = None,
+) -> Iterator[Triple]:
+    """Fire the rule like `single_rule`, over shards of its driving clause's matches.
+
+    The candidates of the first clause of the premise plan are split in
+    `shards` (the CPU count by default), each matched and fired in its own
+    worker process. Conclusions are the same as `single_rule`'s, blank
+    nodes included, without duplicates.
+    """
+    if plan is None:
+        plan = RulePlan(rule)
+    if shards is None:
+        shards = os.cpu_count() or 1
+    driving = _driving_plan(plan)
+    if driving is None or shards <= 1 or not _can_fork():
+        yield from dict.fromkeys(single_rule(facts, rule, plan))
+        return
+    # Sharding may happen while evaluating strata in process
+    outer = dict(_state)
+    _state.update(facts=facts, rule=rule, rule_plan=plan, plan=driving, shards=shards)
+    try:
+        context = multiprocessing.get_context("fork")
+        with ProcessPoolExecutor(shards, mp_context=context) as pool:
+            results = list(pool.map(_fire_shard, range(shards)))
+    finally:
+        _state.clear()
+        _state.update(outer)
+    logger.debug("sharded %i ways", shards)
+    yield from dict.fromkeys(triple for triples in results for triple in triples)
+
+
+def _evaluate_stratum(i: int) -> list[Triple]:
+    program: Program = _state["program"]
+    shards: int = _state["shards"]
+    strata = program.strata[i]
+    rule = strata[0]
+    if (
+        shards > 1
+        and len(strata) == 1
+        and rule not in program.rules_dependencies[rule]
+        and rule_method(rule, program.rules_dependencies) is single_rule
+    ):
+        closure: Graph = _state["closure"]
+        if trace.sinks:
+            trace.emit("rule_start", rule=rule)
+        inferred = list(
+            sharded_rule(closure, rule, get_plan(rule, _state["plans"]), shards)
+        )
+        if trace.sinks:
+            new = sum(1 for triple in inferred if triple not in closure)
+            inferred_graph = encoded(inferred, dictionary_of(closure))
+            trace.emit(
+                "rule_evaluated",
+                rule=rule,
+                method="sharded_rule",
+                inferred=inferred_graph,
+                fired=len(inferred),
+                new=new,
+            )
+        return inferred
+    return list(evaluate_stratum(
+        _state["closure"],
+        program.strata[i],
+        program.rules_dependencies,
+        program.triggered_rules,
+        _state["semi_naive"],
+        _state["plans"],
+    ))
+
+
+def _parallel_stratified(
+    facts: Graph,
+    program: Program,
+    workers: int,
+    semi_naive: bool,
+    shards: int,
+) -> Iterable[Triple]:
+    inferred = encoded(dictionary=dictionary_of(facts))
+    closure = union(facts, inferred)
+    # Facts inferred again, yielded once like the other triples
+    rederived = encoded(dictionary=dictionary_of(facts))
+    statistics = Statistics.of(facts)
+    planned = program.statistics
+    plans = program.plans
+    if statistics.moved(planned):
+        planned = statistics.copy()
+        plans = compile_rules(program.rules, statistics, program.batch)
+
+    dictionary = dictionary_of(facts)
+    for wave in waves(strata_dependencies(program.strata)):
+        logger.debug("wave of %i strata", len(wave))
+        concurrent = len(wave) > 1 and workers > 1 and _can_fork()
+        # Strata evaluated in workers are not sharded further
+        _state.update(
+            program=program,
+            closure=closure,
+            semi_naive=semi_naive,
+            plans=plans,
+            shards=1 if concurrent else shards,
+        )
+        results: list[list[Triple]] = []
+        try:
+            if concurrent:
+                if trace.sinks:
+                    for i in wave:
+                        trace.emit("stratum_start", index=i, rules=program.strata[i])
+                context = multiprocessing.get_context("fork")
+                with ProcessPoolExecutor(
+                    min(workers, len(wave)), mp_context=context
+                ) as pool:
+                    results = list(pool.map(_evaluate_stratum, wave))
+                if trace.sinks:
+                    # The strata all took the time of the wave
+                    for i, new_inferred in reversed(
+                        list(zip(wave, results, strict=True))
+                    ):
+                        trace.emit(
+                            "stratum_end",
+                            index=i,
+                            inferred=encoded(new_inferred, dictionary),
+                        )
+            else:
+                for i in wave:
+                    if trace.sinks:
+                        trace.emit("stratum_start", index=i, rules=program.strata[i])
+                    results.append(_evaluate_stratum(i))
+                    if trace.sinks:
+                        trace.emit(
+                            "stratum_end",
+                            index=i,
+                            inferred=encoded(results[-1], dictionary),
+                        )
+        finally:
+            _state.clear()
+
+        layer = encoded(dictionary=dictionary)
+        for new_inferred in results:
+            for triple in new_inferred:
+                if triple not in closure:
+                    if triple not in layer:
+                        layer.add(triple)
+                        yield triple
+                elif triple not in inferred and triple not in rederived:
+                    rederived.add(triple)
+                    yield triple
+        inferred += layer
+        statistics.update(Statistics.of(layer))
+        if statistics.moved(planned):
+            logger.debug("replanning after wave")
+            if trace.sinks:
+                trace.emit("replan", index=wave[-1])
+            planned = statistics.copy()
+            plans = compile_rules(program.rules, statistics, program.batch)
+
+
+def parallel_stratified(  # noqa: PLR0913
+    facts: Graph,
+    rules: Graph,
+    workers: int | None = None,
+    semi_naive: bool = True,
+    batch: bool = False,
+    program: Program | None = None,
+    shards: int = 1,
+) -> Graph:
+    """Infer the triples of `stratified`, evaluating independent strata concurrently.
+
+    Strata are evaluated in waves, each stratum once every stratum it
+    depends on is merged into the closure, by up to `workers` processes
+    (the CPU count by default). With `shards`, a lone non-recursive rule
+    evaluated like `single_rule` is split with `sharded_rule`.
+    """
+    g = Graph(namespace_manager=facts.namespace_manager)
+    for triple in parallel_stratified_triples(
+        facts, rules, workers, semi_naive, batch, program, shards
+    ):
+        g.add(triple)
+    return g
+
+
+def parallel_stratified_triples(  # noqa: PLR0913
+    facts: Graph,
+    rules: Graph,
+    workers: int | None = None,
+    semi_naive: bool = True,
+    batch: bool = False,
+    program: Program | None = None,
+    shards: int = 1,
+) -> Iterator[Triple]:
+    """Yield the triples of `parallel_stratified` once each, wave after wave."""
+    if program is None:
+        program = Program(rules, Statistics.of(facts), batch)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    return iter(_parallel_stratified(facts, program, workers, semi_naive, shards))
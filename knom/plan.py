@@ -0,0 +1,481 @@
+import logging
+from collections.abc import Callable, Iterable, Iterator
+
+from rdflib import BNode, Graph, URIRef, Variable
+from rdflib.collection import Collection
+from rdflib.namespace import RDF
+from rdflib.term import Node
+
+from knom import skolem, trace
+from knom.builtins import BUILTINS
+from knom.statistics import Statistics
+from knom.typing import Bindings, Triple
+from knom.util import LOG, add_triples, get_body, get_head
+
+logger = logging.getLogger(__name__)
+
+NEGATION_PREDICATE = LOG.notIncludes
+
+Row = list[Node | None]
+
+
+def builtin_lists(head: Graph) -> set[Node]:
+    """Return the list nodes used as builtin arguments in the premise."""
+    lists = set()
+    for s, p, _ in head:
+        if p in BUILTINS:
+            node: Node | None = s
+            while (
+                node is not None
+                and (node, RDF.first, None) in head
+                and node not in lists
+            ):
+                lists.add(node)
+                node = head.value(node, RDF.rest)
+    return lists
+
+
+def variables(node: Node | Triple) -> Iterator[Variable | BNode]:
+    """Yield variables and bnodes of a node or triple, including nested formulas."""
+    if isinstance(node, Variable | BNode):
+        yield node
+    elif isinstance(node, Graph | tuple | list):
+        for child in node:
+            yield from variables(child)
+
+
+class MatchStep:
+    """Match a premise clause against the facts, or the delta if `delta`."""
+
+    __slots__ = ("clause", "delta", "nested", "slots", "terms")
+
+    def __init__(
+        self,
+        clause: Triple,
+        slots: dict[Variable | BNode, int],
+        bound: set[Variable | BNode],
+        delta: bool = False,
+    ) -> None:
+        self.clause = clause
+        self.terms = tuple(
+            None if isinstance(n, Variable | BNode | Graph) else n for n in clause
+        )
+        self.slots = tuple(
+            slots[n] if isinstance(n, Variable | BNode) else None for n in clause
+        )
+        self.nested = tuple(
+            (i, compile_head(n, bound, slots))
+            for i, n in enumerate(clause)
+            if isinstance(n, Graph)
+        )
+        self.delta = delta
+
+
+class BuiltinStep:
+    """Call a builtin with arguments resolved at compile time."""
+
+    __slots__ = ("clause", "function", "object", "subject")
+
+    def __init__(self, clause: Triple, head: Graph) -> None:
+        s, p, o = clause
+        assert isinstance(p, URIRef)
+        self.clause = clause
+        self.function: Callable[..., Iterable[Bindings]] = BUILTINS[p]
+        col = list(Collection(head, s))
+        self.subject: Node | list[Node] = col if len(col) > 0 else s
+        self.object = o
+
+
+class NegationStep:
+    """Check that a formula has no match, once the variables it shares are bound.
+
+    The formula is matched against its scope when it is a formula, or
+    against the facts otherwise.
+    """
+
+    __slots__ = ("clause", "plan", "scope")
+
+    def __init__(
+        self,
+        clause: Triple,
+        slots: dict[Variable | BNode, int],
+        bound: set[Variable | BNode],
+        statistics: Statistics | None = None,
+    ) -> None:
+        scope, _, formula = clause
+        assert isinstance(formula, Graph)
+        self.clause = clause
+        self.scope = slots.get(scope) if isinstance(scope, Variable | BNode) else scope
+        self.plan = compile_head(formula, bound, slots, statistics=statistics)
+
+
+Step = MatchStep | BuiltinStep | NegationStep
+
+
+class Plan:
+    """Fixed evaluation order of a premise over numbered variable slots."""
+
+    __slots__ = ("slots", "steps", "variables")
+
+    def __init__(self, slots: dict[Variable | BNode, int], steps: list[Step]) -> None:
+        self.slots = slots
+        self.variables = list(slots)
+        self.steps = steps
+
+    def row(self, bindings: Bindings) -> Row:
+        return [bindings.get(v) for v in self.variables]
+
+    def bindings(self, row: Row) -> Bindings:
+        return {
+            v: value
+            for v, value in zip(self.variables, row, strict=True)
+            if value is not None
+        }
+
+
+# Components of head_sort_key that keep lists and builtins in place
+BUILTIN_KEY_LENGTH = 5
+
+
+def _order(
+    clauses: list[Triple],
+    bound: set[Variable | BNode],
+    statistics: Statistics | None = None,
+) -> Iterator[Triple]:
+    from knom import head_sort_key
+
+    bound = set(bound)
+    prev: Triple | tuple[None, None, None] = (None, None, None)
+
+    def key(triple: Triple) -> tuple:
+        syntactic = head_sort_key(prev, triple, dict.fromkeys(bound))  # type: ignore[arg-type]
+        if statistics is None or triple[1] in BUILTINS:
+            return syntactic
+        # Cheapest clause among those allowed at this point
+        return (
+            *syntactic[:BUILTIN_KEY_LENGTH],
+            -statistics.estimate(triple, bound),
+            *syntactic[BUILTIN_KEY_LENGTH:],
+        )
+
+    while len(clauses) > 0:
+        clause = max(clauses, key=key)
+        clauses.remove(clause)
+        bound.update(variables(clause))
+        prev = clause
+        yield clause
+
+
+def compile_head(
+    head: Iterable[Triple],
+    bound: Iterable[Variable | BNode] = (),
+    slots: dict[Variable | BNode, int] | None = None,
+    first: Triple | None = None,
+    statistics: Statistics | None = None,
+) -> Plan:
+    """Compile a premise into a plan.
+
+    `bound` are the variables bound before the plan runs, `slots` is shared
+    with enclosing plans of nested formulas, and `first` is a clause to be
+    matched first against the delta. With `statistics` of the facts, the
+    clauses are ordered by their estimated number of matches.
+    """
+    if not isinstance(head, Graph):
+        head = add_triples(Graph(), head)
+    if slots is None:
+        slots = {}
+    bound = set(bound)
+    for node in [*bound, *variables(head)]:
+        slots.setdefault(node, len(slots))
+
+    lists = builtin_lists(head)
+    clauses = [
+        (s, p, o)
+        for s, p, o in head
+        if not (p in (RDF.first, RDF.rest) and s in lists)
+        and (s, p, o) != first
+        and not (p == NEGATION_PREDICATE and isinstance(o, Graph))
+    ]
+    steps: list[Step] = []
+    if first is not None:
+        steps.append(MatchStep(first, slots, bound, delta=True))
+        bound.update(variables(first))
+    for clause in _order(clauses, bound, statistics):
+        if clause[1] in BUILTINS:
+            steps.append(BuiltinStep(clause, head))
+        else:
+            steps.append(MatchStep(clause, slots, bound))
+        bound.update(variables(clause))
+    # Anti-joins, once everything else is bound
+    for clause in head:
+        if clause[1] == NEGATION_PREDICATE and isinstance(clause[2], Graph):
+            steps.append(NegationStep(clause, slots, bound, statistics))
+    return Plan(slots, steps)
+
+
+class RulePlan:
+    """Plans of a rule premise: a full one and one per possible delta clause.
+
+    The conclusion is compiled along, when it is a formula. With `batch` the
+    plans are evaluated set-at-a-time with hash joins.
+    """
+
+    __slots__ = ("batch", "conclusion", "deltas", "premise")
+
+    def __init__(
+        self,
+        rule: Triple,
+        statistics: Statistics | None = None,
+        batch: bool = False,
+    ) -> None:
+        head = get_head(rule)
+        body = get_body(rule)
+        self.batch = batch
+        self.conclusion = compile_body(body) if isinstance(body, Graph) else None
+        self.premise: Plan | None = None
+        self.deltas: list[Plan] = []
+        if isinstance(head, Graph):
+            self.premise = compile_head(head, statistics=statistics)
+            lists = builtin_lists(head)
+            self.deltas = [
+                compile_head(head, first=clause, statistics=statistics)
+                for clause in head
+                if clause[1] not in BUILTINS
+                and clause[1] != NEGATION_PREDICATE
+                and not (clause[1] in (RDF.first, RDF.rest) and clause[0] in lists)
+            ]
+
+
+    def _run(
+        self, plan: Plan, facts: Graph, delta: Graph | None = None
+    ) -> Iterator[Bindings]:
+        if self.batch:
+            from knom.join import run_batch
+
+            return run_batch(plan, facts, delta=delta)
+        return run_plan(plan, facts, delta=delta)
+
+    def match(self, facts: Graph) -> Iterator[Bindings]:
+        assert self.premise is not None
+        return self._run(self.premise, facts)
+
+    def match_delta(self, facts: Graph, delta: Graph) -> Iterator[Bindings]:
+        for plan in self.deltas:
+            yield from self._run(plan, facts, delta)
+
+
+Plans = dict[Triple, RulePlan]
+
+
+class Template:
+    """Conclusion triples with their constants filled in and variables as slots.
+
+    Nested formulas are templates too, built into a fresh graph for each
+    firing, ground ones included, as consumers may change the formulas they
+    are given.
+    """
+
+    __slots__ = ("triples",)
+
+    def __init__(self, formula: Graph, slots: dict[Variable | BNode, int]) -> None:
+        # Constant triple, then (position, slot) and (position, nested template) pairs
+        self.triples: list[
+            tuple[
+                tuple, tuple[tuple[int, int], ...], tuple[tuple[int, "Template"], ...]
+            ]
+        ] = []
+        for triple in formula:
+            constant = tuple(
+                None if isinstance(n, Variable | BNode | Graph) else n for n in triple
+            )
+            variable = tuple(
+                (i, slots.setdefault(n, len(slots)))
+                for i, n in enumerate(triple)
+                if isinstance(n, Variable | BNode)
+            )
+            nested = tuple(
+                (i, Template(n, slots))
+                for i, n in enumerate(triple)
+                if isinstance(n, Graph)
+            )
+            self.triples.append((constant, variable, nested))
+
+    def instantiate(self, values: Row) -> Iterator[Triple]:
+        """Yield the triples with the slots filled, fresh blank nodes for None."""
+        for constant, variable, nested in self.triples:
+            if len(variable) == 0 and len(nested) == 0:
+                yield constant
+                continue
+            triple = list(constant)
+            for i, slot in variable:
+                value = values[slot]
+                triple[i] = BNode() if value is None else value
+            for i, template in nested:
+                triple[i] = template.build(values)
+            yield tuple(triple)
+
+    def build(self, values: Row) -> Graph:
+        g = Graph()
+        for triple in self.instantiate(values):
+            g.add(triple)
+        return g
+
+
+class Conclusion:
+    """Conclusion of a rule compiled once, fired by filling its template's slots.
+
+    Its `names` name the blank nodes each firing leaves unbound.
+    """
+
+    __slots__ = ("body", "names", "slots", "template", "variables")
+
+    def __init__(self, body: Graph) -> None:
+        self.body = body
+        self.slots: dict[Variable | BNode, int] = {}
+        self.template = Template(body, self.slots)
+        self.variables = list(self.slots)
+        self.names = skolem.Names(body)
+
+    def fire(
+        self, bindings: Bindings, names: Bindings | None = None
+    ) -> Iterator[Triple]:
+        """Yield the conclusions for the bindings, blank nodes taking their `names`."""
+        if names:
+            values = [bindings.get(v, names.get(v)) for v in self.variables]
+        else:
+            values = [bindings.get(v) for v in self.variables]
+        return self.template.instantiate(values)
+
+
+def compile_body(body: Graph) -> Conclusion:
+    """Compile a conclusion into a template."""
+    return Conclusion(body)
+
+
+def compile_rules(
+    rules: Iterable[Triple],
+    statistics: Statistics | None = None,
+    batch: bool = False,
+) -> Plans:
+    return {rule: RulePlan(rule, statistics, batch) for rule in rules}
+
+
+def get_plan(rule: Triple, plans: Plans | None) -> RulePlan:
+    if plans is None or rule not in plans:
+        return RulePlan(rule)
+    return plans[rule]
+
+
+def _nested(
+    nested: tuple[tuple[int, Plan], ...], i: int, row: Row, fact: Triple
+) -> Iterator[Row]:
+    if i == len(nested):
+        yield row
+        return
+    pos, plan = nested[i]
+    formula = fact[pos]
+    if not isinstance(formula, Graph):
+        return
+    for row_ in run_rows(plan, row, formula):
+        yield from _nested(nested, i + 1, row_, fact)
+
+
+def match_step(step: MatchStep, row: Row, facts: Graph) -> Iterator[Row]:
+    terms = step.terms
+    slots = step.slots
+    clause = step.clause
+    mask = tuple(
+        terms[i] if slots[i] is None else row[slots[i]]  # type: ignore[index]
+        for i in range(3)
+    )
+    scanned = 0
+    # Reported when the join stops early too, as under a guard
+    try:
+        for fact in facts.triples(mask):  # type: ignore[arg-type]
+            scanned += 1
+            new = row.copy()
+            for i, slot in enumerate(slots):
+                if slot is None:
+                    continue
+                value = fact[i]
+                if isinstance(value, Variable):
+                    break
+                current = new[slot]
+                if current is None:
+                    new[slot] = value
+                elif current != value and clause[i] != value:
+                    break
+            else:
+                if len(step.nested) > 0:
+                    yield from _nested(step.nested, 0, new, fact)
+                else:
+                    yield new
+    finally:
+        if trace.sinks:
+            trace.emit("step", clause=clause, scanned=scanned)
+
+
+def call_step(plan: Plan, step: BuiltinStep, row: Row, facts: Graph) -> Iterator[Row]:
+    bindings = plan.bindings(row)
+    for bindings_ in step.function(step.subject, step.object, bindings, facts):
+        yield plan.row(bindings_)
+
+
+def negation_step(step: NegationStep, row: Row, facts: Graph) -> Iterator[Row]:
+    scope = row[step.scope] if isinstance(step.scope, int) else step.scope
+    if isinstance(scope, Graph):
+        facts = scope
+    # Any match of the formula is enough to reject the row
+    for _ in run_rows(step.plan, row, facts):
+        return
+    yield row
+
+
+def run_rows(
+    plan: Plan, row: Row, facts: Graph, delta: Graph | None = None
+) -> Iterator[Row]:
+    steps = plan.steps
+    n = len(steps)
+    if n == 0:
+        yield row
+        return
+
+    def step_rows(depth: int, row: Row) -> Iterator[Row]:
+        step = steps[depth]
+        if isinstance(step, BuiltinStep):
+            return call_step(plan, step, row, facts)
+        if isinstance(step, NegationStep):
+            return negation_step(step, row, facts)
+        source = delta if step.delta else facts
+        assert source is not None
+        return match_step(step, row, source)
+
+    stack = [step_rows(0, row)]
+    while len(stack) > 0:
+        depth = len(stack)
+        for row_ in stack[-1]:
+            if depth == n:
+                yield row_
+            else:
+                stack.append(step_rows(depth, row_))
+                break
+        else:
+            stack.pop()
+
+
+def run_plan(
+    plan: Plan,
+    facts: Graph,
+    bindings: Bindings | None = None,
+    delta: Graph | None = None,
+) -> Iterator[Bindings]:
+    logger.debug("run_plan %i steps", len(plan.steps))
+    row = plan.row({} if bindings is None else bindings)
+    produced = 0
+    try:
+        for row_ in run_rows(plan, row, facts, delta):
+            produced += 1
+            yield plan.bindings(row_)
+    finally:
+        if trace.sinks:
+            trace.emit("matched", bindings=produced)
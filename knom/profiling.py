@@ -0,0 +1,111 @@
+import json
+import time
+from typing import Any
+
+from knom.typing import Triple
+from knom.util import print_rule, print_triple
+
+
+class RuleProfile:
+    def __init__(self, rule: Triple) -> None:
+        self.rule = rule
+        self.methods: set[str] = set()
+        self.evaluations = 0
+        self.seconds = 0.0
+        self.steps = 0
+        # Candidate facts scanned per premise clause
+        self.scanned: dict[Triple, int] = {}
+        self.bindings = 0
+        self.fired = 0
+        self.new = 0
+
+    @property
+    def duplicates(self) -> int:
+        return self.fired - self.new
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "rule": print_rule(self.rule),
+            "methods": sorted(self.methods),
+            "evaluations": self.evaluations,
+            "seconds": self.seconds,
+            "steps": self.steps,
+            "scanned": {print_triple(c): n for c, n in self.scanned.items()},
+            "bindings": self.bindings,
+            "fired": self.fired,
+            "new": self.new,
+            "duplicates": self.duplicates,
+        }
+
+
+class StratumProfile:
+    def __init__(self, index: int, rules: list[Triple]) -> None:
+        self.index = index
+        self.rules = rules
+        self.seconds = 0.0
+        self.inferred = 0
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "index": self.index,
+            "rules": [print_rule(rule) for rule in self.rules],
+            "seconds": self.seconds,
+            "inferred": self.inferred,
+        }
+
+
+class Profile:
+    """Trace sink collecting per-rule and per-stratum counters.
+
+    Matching done while a rule is evaluated, including the helper rules of
+    with_guard and negative_rule, is attributed to that rule.
+    """
+
+    def __init__(self) -> None:
+        self.rules: dict[Triple, RuleProfile] = {}
+        self.strata: list[StratumProfile] = []
+        self._rules: list[tuple[RuleProfile, float]] = []
+        self._strata: list[tuple[StratumProfile, float]] = []
+
+    def __call__(self, event: str, fields: dict[str, Any]) -> None:
+        now = time.perf_counter()
+        if event == "stratum_start":
+            stratum = StratumProfile(fields["index"], list(fields["rules"]))
+            self.strata.append(stratum)
+            self._strata.append((stratum, now))
+        elif event == "stratum_end" and len(self._strata) > 0:
+            stratum, start = self._strata.pop()
+            stratum.seconds += now - start
+            stratum.inferred += len(fields["inferred"])
+        elif event == "rule_start":
+            rule = fields["rule"]
+            if rule not in self.rules:
+                self.rules[rule] = RuleProfile(rule)
+            self._rules.append((self.rules[rule], now))
+        elif event == "rule_evaluated" and len(self._rules) > 0:
+            profile, start = self._rules.pop()
+            profile.seconds += now - start
+            profile.evaluations += 1
+            profile.methods.add(fields["method"])
+            profile.fired += fields["fired"]
+            profile.new += fields["new"]
+        elif len(self._rules) > 0:
+            profile = self._rules[-1][0]
+            if event == "step":
+                profile.steps += 1
+                clause = fields["clause"]
+                profile.scanned[clause] = (
+                    profile.scanned.get(clause, 0) + fields["scanned"]
+                )
+            elif event == "matched":
+                profile.bindings += fields["bindings"]
+
+    def to_dict(self) -> dict[str, Any]:
+        rules = sorted(self.rules.values(), key=lambda profile: -profile.seconds)
+        return {
+            "strata": [stratum.to_dict() for stratum in self.strata],
+            "rules": [profile.to_dict() for profile in rules],
+        }
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), indent=2)
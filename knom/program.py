@@ -0,0 +1,116 @@
+"""Compiled programs: the analysis of a rule set, persisted between runs.
+
+A program is keyed by a digest of the rules' content, so a cached program
+is only reused for the same rules, whatever names their blank nodes got
+when parsed.
+"""
+import logging
+import os
+import pickle
+from collections.abc import Iterable
+from hashlib import sha256
+from pathlib import Path
+
+from rdflib import BNode, Graph
+from rdflib.term import Node
+
+from knom.plan import compile_rules
+from knom.statistics import Statistics
+from knom.stratified import get_rules_dependencies, get_triggered_rules, stratify_rules
+from knom.typing import Rule, Triple
+
+logger = logging.getLogger(__name__)
+
+# Bumped whenever compiled programs change shape
+FORMAT_VERSION = 2
+
+
+def _render(node: Node, names: dict[BNode, str] | None) -> str:
+    """Render a node, numbering blank nodes in `names`, or masking them without."""
+    if isinstance(node, BNode):
+        if names is None:
+            return "[]"
+        return names.setdefault(node, f"_:b{len(names)}")
+    if isinstance(node, Graph):
+        return "{" + ". ".join(_render_clauses(node, names)) + "}"
+    return node.n3()
+
+
+def _render_clauses(
+    clauses: Iterable[Triple], names: dict[BNode, str] | None
+) -> list[str]:
+    ordered = sorted(
+        clauses, key=lambda clause: " ".join(_render(n, None) for n in clause)
+    )
+    return [" ".join(_render(n, names) for n in clause) for clause in ordered]
+
+
+def rules_digest(rules: Graph) -> str:
+    """Return a hash of the rules, the same for rules parsed again."""
+    rendered = sorted(_render_clauses([rule], {})[0] for rule in rules)
+    content = "\n".join([f"knom program {FORMAT_VERSION}", *rendered])
+    return sha256(content.encode("utf-8")).hexdigest()
+
+
+class Program:
+    """Rules compiled for stratified evaluation.
+
+    Holds what only depends on the rules: their dependencies and strata,
+    and plans compiled with `statistics`, which are reused as long as the
+    statistics of the facts have not moved from those.
+    """
+
+    def __init__(
+        self, rules: Graph, statistics: Statistics | None = None, batch: bool = False
+    ) -> None:
+        self.rules = rules
+        self.digest = rules_digest(rules)
+        self.rules_dependencies = get_rules_dependencies(rules)
+        self.triggered_rules = get_triggered_rules(self.rules_dependencies)
+        self.strata: list[list[Rule]] = list(
+            stratify_rules(rules, self.rules_dependencies)  # type: ignore[arg-type]
+        )
+        self.statistics = Statistics() if statistics is None else statistics.copy()
+        self.batch = batch
+        self.plans = compile_rules(rules, self.statistics, batch)
+
+    def save(self, path: str | Path) -> None:
+        path = Path(path)
+        # Concurrent runs only ever see complete files
+        partial = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with partial.open("wb") as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+        partial.replace(path)
+
+    @classmethod
+    def load(cls, path: str | Path) -> "Program":
+        with Path(path).open("rb") as f:
+            program = pickle.load(f)  # noqa: S301
+        if not isinstance(program, cls):
+            raise TypeError(f"{path} holds no compiled program")
+        return program
+
+
+def cached_program(
+    rules: Graph,
+    directory: str | Path,
+    statistics: Statistics | None = None,
+    batch: bool = False,
+) -> Program:
+    """Load the compiled program of the rules from the directory, compiling it once."""
+    directory = Path(directory)
+    suffix = "-batch" if batch else ""
+    path = directory / f"{rules_digest(rules)}{suffix}.pickle"
+    try:
+        program = Program.load(path)
+        logger.debug("loaded program %s", path)
+        return program
+    except FileNotFoundError:
+        pass
+    except (OSError, EOFError, TypeError, AttributeError, pickle.UnpicklingError) as e:
+        logger.warning("recompiling %s: %s", path, e)
+    program = Program(rules, statistics, batch)
+    directory.mkdir(parents=True, exist_ok=True)
+    program.save(path)
+    logger.debug("saved program %s", path)
+    return program
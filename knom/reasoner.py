@@ -0,0 +1,352 @@
+import logging
+from collections.abc import Iterable
+
+from rdflib import Graph, Variable
+from rdflib.term import BNode
+
+from knom import delta_rule, fire_rule, single_rule, trace
+from knom.builtins import BUILTINS
+from knom.graph import union
+from knom.plan import Plan, compile_head, compile_rules, get_plan, run_plan, variables
+from knom.program import Program
+from knom.statistics import Statistics
+from knom.store import dictionary_of, encoded
+from knom.stratified import (
+    concludes_fresh_nodes,
+    evaluate_stratum,
+    get_rules_dependencies,
+    get_triggered_rules,
+    is_incremental,
+    stratify_rules,
+)
+from knom.typing import Bindings, Mask, Rule, Triple
+from knom.util import get_body, get_head
+
+logger = logging.getLogger(__name__)
+
+
+def _mask(triple: Triple) -> Mask:
+    """Return the pattern of the facts a clause may stand for."""
+    s, p, o = (
+        None if isinstance(node, Variable | BNode | Graph) else node for node in triple
+    )
+    return s, p, o
+
+
+def _patterns(formula: Graph) -> Iterable[Mask]:
+    """Yield the patterns of facts a premise may match, nested formulas included."""
+    for triple in formula:
+        for node in triple:
+            if isinstance(node, Graph):
+                yield from _patterns(node)
+        if triple[1] in BUILTINS:
+            continue
+        yield _mask(triple)
+
+
+def _matches(triples: Graph, patterns: Iterable[Mask]) -> bool:
+    return any(
+        next(iter(triples.triples(pattern)), None) is not None for pattern in patterns
+    )
+
+
+def _reaches(rule: Rule, delta: Graph) -> bool:
+    head = get_head(rule)
+    if not isinstance(head, Graph):
+        return len(delta) > 0
+    return _matches(delta, _patterns(head))
+
+
+def _concludes(rule: Rule, deleted: Graph) -> bool:
+    """Return whether the rule may conclude some of the deleted triples."""
+    body = get_body(rule)
+    if not isinstance(body, Graph):
+        return len(deleted) > 0
+    return _matches(deleted, map(_mask, body))
+
+
+class Reasoner:
+    """Reasoning session keeping the closure of the facts under the rules.
+
+    The inferred triples are kept in one layer per stratum, each triple in
+    the layer of the first stratum inferring it, so that added and removed
+    facts only propagate through the strata they reach. With a `program`
+    compiled from the rules, its analysis is reused.
+    """
+
+    def __init__(
+        self,
+        rules: Graph,
+        facts: Iterable[Triple] = (),
+        semi_naive: bool = True,
+        batch: bool = False,
+        program: Program | None = None,
+    ) -> None:
+        self.semi_naive = semi_naive
+        self.batch = batch
+        namespace_manager = (
+            facts.namespace_manager if isinstance(facts, Graph) else None
+        )
+        self.facts = encoded(facts, namespace_manager=namespace_manager)
+        self.dictionary = dictionary_of(self.facts)
+        self.statistics = Statistics.of(self.facts)
+        if program is None:
+            self.rules = rules
+            self.rules_dependencies = get_rules_dependencies(rules)
+            self.triggered_rules = get_triggered_rules(self.rules_dependencies)
+            self.strata: list[list[Rule]] = list(
+                stratify_rules(rules, self.rules_dependencies)  # type: ignore[arg-type]
+            )
+            self._planned = self.statistics.copy()
+            self.plans = compile_rules(rules, self.statistics, batch)
+        else:
+            self.rules = program.rules
+            self.rules_dependencies = program.rules_dependencies
+            self.triggered_rules = program.triggered_rules
+            self.strata = program.strata
+            self._planned = program.statistics
+            self.plans = program.plans
+            if self.statistics.moved(self._planned) or batch != program.batch:
+                self._planned = self.statistics.copy()
+                self.plans = compile_rules(self.rules, self.statistics, batch)
+        self.layers = [encoded(dictionary=self.dictionary) for _ in self.strata]
+        self.closure = union(self.facts, *self.layers)
+        self.inferred = union(encoded(dictionary=self.dictionary), *self.layers)
+        self._rederive_plans: dict[tuple[Rule, Triple], tuple[Plan, set[Variable]]] = {}
+        for i in range(len(self.strata)):
+            self.layers[i] += self._settle(i, self._evaluate(i))[0]
+            self.statistics.update(Statistics.of(self.layers[i]))
+            self._replan(i)
+
+    def _below(self, i: int) -> Graph:
+        """Return the closure as seen by stratum i."""
+        return union(self.facts, *self.layers[:i])
+
+    def _evaluate(self, i: int, delta: Graph | None = None) -> Graph:
+        strata = self.strata[i]
+        if trace.sinks:
+            trace.emit("stratum_start", index=i, rules=strata)
+        closure = (
+            union(self.facts, *self.layers[: i + 1])
+            if delta is not None
+            else self._below(i)
+        )
+        new_inferred = evaluate_stratum(
+            closure,
+            strata,
+            self.rules_dependencies,
+            self.triggered_rules,
+            self.semi_naive,
+            self.plans,
+            delta,
+        )
+        if trace.sinks:
+            trace.emit("stratum_end", index=i, inferred=new_inferred)
+        return new_inferred
+
+    def _settle(self, i: int, inferred: Iterable[Triple]) -> tuple[Graph, Graph]:
+        """Keep the triples first inferred by stratum i, moving them from later layers.
+
+        Returns the kept triples and the moved ones among them.
+        """
+        below = self._below(i)
+        settled = encoded(dictionary=self.dictionary)
+        moved = encoded(dictionary=self.dictionary)
+        for triple in inferred:
+            if triple in below:
+                continue
+            settled.add(triple)
+            for later in self.layers[i + 1 :]:
+                if triple in later:
+                    later.remove(triple)
+                    moved.add(triple)
+                    break
+        return settled, moved
+
+    def _replan(self, i: int) -> None:
+        if self.statistics.moved(self._planned):
+            logger.debug("replanning after strata %i", i)
+            if trace.sinks:
+                trace.emit("replan", index=i)
+            self._planned = self.statistics.copy()
+            self.plans = compile_rules(self.rules, self.statistics, self.batch)
+
+    def _set_layer(self, i: int, layer: Graph) -> None:
+        self.layers[i] = layer
+        self.closure.store.layers[i + 1] = layer  # type: ignore[attr-defined]
+        self.inferred.store.layers[i + 1] = layer  # type: ignore[attr-defined]
+
+    def _overdelete(self, i: int, deleted: Graph) -> Graph:
+        """Return the triples of layer i inferred from deleted ones, directly or not."""
+        strata = self.strata[i]
+        layer = self.layers[i]
+        # The closure before the deletion
+        closure = union(self.facts, *self.layers[: i + 1], deleted)
+        overdeleted = encoded(dictionary=self.dictionary)
+        frontier = deleted
+        while len(frontier) > 0:
+            found = encoded(dictionary=self.dictionary)
+            for rule in strata:
+                for triple in delta_rule(
+                    closure, frontier, rule, get_plan(rule, self.plans)
+                ):
+                    if triple in layer and triple not in overdeleted:
+                        found.add(triple)
+            overdeleted += found
+            frontier = found
+        return overdeleted
+
+    def _rederive_plan(self, rule: Rule, clause: Triple) -> tuple[Plan, set[Variable]]:
+        key = (rule, clause)
+        if key not in self._rederive_plans:
+            head = get_head(rule)
+            assert isinstance(head, Graph)
+            bound = {
+                node for node in variables(clause) if isinstance(node, Variable)
+            } & set(variables(head))
+            self._rederive_plans[key] = (compile_head(head, bound), bound)
+        return self._rederive_plans[key]
+
+    def _rederive(self, i: int, candidates: Graph) -> Graph:
+        """Return the candidates stratum i still infers from the current closure."""
+        closure = union(self.facts, *self.layers[: i + 1])
+        rederived = encoded(dictionary=self.dictionary)
+        for rule in self.strata[i]:
+            head = get_head(rule)
+            body = get_body(rule)
+            if not isinstance(head, Graph) or not isinstance(body, Graph):
+                rederived += (t for t in single_rule(closure, rule) if t in candidates)
+                continue
+            for clause in body:
+                plan, bound = self._rederive_plan(rule, clause)
+                for candidate in candidates.triples(_mask(clause)):
+                    if candidate in rederived:
+                        continue
+                    # Bind the premise variables the conclusion clause shares
+                    bindings: Bindings = {}
+                    if any(
+                        bindings.setdefault(node, value) != value
+                        for node, value in zip(clause, candidate, strict=True)
+                        if isinstance(node, Variable) and node in bound
+                    ):
+                        continue
+                    rule_plan = get_plan(rule, self.plans)
+                    for match in run_plan(plan, closure, bindings):
+                        rederived += (
+                            t
+                            for t in fire_rule(rule, match, rule_plan)
+                            if t in candidates
+                        )
+                        if candidate in rederived:
+                            break
+        return rederived
+
+    def _maintain(self, deleted: Graph, delta: Graph) -> Graph:
+        """Propagate deleted and new triples through the strata.
+
+        `deleted` are the triples gone from the closure and `delta` the triples
+        new to some stratum, both are updated in place. Strata of incremental
+        rules delete and rederive (DRed): everything inferred from the deleted
+        triples is deleted, then whatever is still inferred from the rest is
+        restored, along with the consequences of the new triples. Other strata
+        (negation, scoped builtins, guards) are reevaluated once the changes
+        reach their premises, or one of the triples they conclude is deleted,
+        as facts asserted again are kept out of the layers. So are strata whose
+        conclusions have nodes of their own on deletions, as firing them again
+        names those nodes anew. Returns the triples new to the closure.
+        """
+        added = encoded(dictionary=self.dictionary)
+        for i, strata in enumerate(self.strata):
+            old = self.layers[i]
+            fresh = len(deleted) > 0 and any(map(concludes_fresh_nodes, strata))
+            if fresh or not all(
+                is_incremental(rule, self.rules_dependencies) for rule in strata
+            ):
+                if not any(
+                    _reaches(rule, deleted)
+                    or _reaches(rule, delta)
+                    or _concludes(rule, deleted)
+                    for rule in strata
+                ):
+                    continue
+                settled, moved = self._settle(i, self._evaluate(i))
+                withdrawn = encoded(
+                    (t for t in old if t not in settled), self.dictionary
+                )
+                new = encoded((t for t in settled if t not in old), self.dictionary)
+                self._set_layer(i, settled)
+            else:
+                withdrawn = encoded(dictionary=self.dictionary)
+                new = encoded(dictionary=self.dictionary)
+                moved = encoded(dictionary=self.dictionary)
+                if len(deleted) > 0:
+                    withdrawn = self._overdelete(i, deleted)
+                    for triple in withdrawn:
+                        old.remove(triple)
+                    new = self._rederive(
+                        i, encoded(union(deleted, withdrawn), self.dictionary)
+                    )
+                    old += new
+                if len(delta) > 0 or len(new) > 0:
+                    settled, moved = self._settle(
+                        i,
+                        self._evaluate(i, encoded(union(delta, new), self.dictionary)),
+                    )
+                    inferred = encoded(
+                        (t for t in settled if t not in old), self.dictionary
+                    )
+                    old += inferred
+                    new += inferred
+                if len(withdrawn) == 0 and len(new) == 0:
+                    continue
+
+            for triple in withdrawn:
+                if triple not in new:
+                    deleted.add(triple)
+            for triple in new:
+                if triple in deleted:
+                    deleted.remove(triple)
+                elif triple not in withdrawn and triple not in moved:
+                    added.add(triple)
+            delta += new
+            self.statistics.subtract(Statistics.of(withdrawn - new))
+            self.statistics.update(Statistics.of(new - withdrawn - moved))
+            self._replan(i)
+        return added
+
+    def add(self, triples: Iterable[Triple]) -> Graph:
+        """Add facts and infer their consequences, returning the new triples.
+
+        Conclusions of negative rules the facts contradict are removed.
+        """
+        delta = encoded(dictionary=self.dictionary)
+        added = encoded(dictionary=self.dictionary)
+        for triple in triples:
+            if triple in self.facts:
+                continue
+            for layer in self.layers:
+                if triple in layer:
+                    layer.remove(triple)
+                    break
+            else:
+                added.add(triple)
+            self.facts.add(triple)
+            delta.add(triple)
+        self.statistics.update(Statistics.of(added))
+        added += self._maintain(encoded(dictionary=self.dictionary), delta)
+        return added
+
+    def remove(self, triples: Iterable[Triple]) -> Graph:
+        """Retract facts and their consequences, returning the triples gone from it.
+
+        Triples still inferred from the remaining facts stay in the closure,
+        as do conclusions of negative rules the facts no longer contradict.
+        """
+        deleted = encoded(dictionary=self.dictionary)
+        for triple in triples:
+            if triple in self.facts:
+                self.facts.remove(triple)
+                deleted.add(triple)
+        self.statistics.subtract(Statistics.of(deleted))
+        self._maintain(deleted, encoded(dictionary=self.dictionary))
+        return deleted
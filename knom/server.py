@@ -0,0 +1,157 @@
+"""Resident reasoning over local HTTP, the rules compiled once for all requests.
+
+Requests and responses hold N-Triples, requests typed `text/n3` are read
+as N3:
+
+- `POST /infer`: the triples inferred from the facts in the body, nothing is kept
+- `POST /facts`: the facts are added to the closure, returns the triples new to it
+- `POST /retract`: the facts are removed, returns the triples gone from the closure
+- `GET /query?s=&p=&o=`: the triples of the closure matching the pattern, whose
+  bound positions are N-Triples terms
+
+The closure is only kept when the service starts with facts. Requests are
+answered one at a time. Blank nodes in a request body are scoped to it,
+only queries name blank nodes of the closure by their label.
+"""
+import logging
+from collections.abc import Iterable, Iterator
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from io import StringIO
+from typing import Any
+from urllib.parse import parse_qs, urlsplit
+
+from rdflib import Graph
+
+from knom import ntriples
+from knom.program import Program
+from knom.reasoner import Reasoner
+from knom.statistics import Statistics
+from knom.store import dictionary_of, encoded
+from knom.stratified import stratified_triples
+from knom.typing import Mask, Triple
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "application/n-triples"
+
+
+class Service:
+    """Rules compiled once, and the closure of the resident facts if there are some."""
+
+    def __init__(
+        self, rules: Graph, facts: Graph | None = None, batch: bool = False
+    ) -> None:
+        self.program = Program(
+            rules, None if facts is None else Statistics.of(facts), batch
+        )
+        self.reasoner = None
+        if facts is not None:
+            self.reasoner = Reasoner(rules, facts, batch=batch, program=self.program)
+
+    def infer(self, facts: Graph) -> Iterator[Triple]:
+        return stratified_triples(
+            facts, self.program.rules, batch=self.program.batch, program=self.program
+        )
+
+    def add(self, facts: Iterable[Triple]) -> Graph:
+        assert self.reasoner is not None
+        return self.reasoner.add(facts)
+
+    def remove(self, facts: Iterable[Triple]) -> Graph:
+        assert self.reasoner is not None
+        return self.reasoner.remove(facts)
+
+    def query(self, pattern: Mask) -> Iterator[Triple]:
+        assert self.reasoner is not None
+        return self.reasoner.closure.triples(pattern)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: "_Server"
+
+    def _facts(self, resident: bool = False) -> Graph:
+        length = int(self.headers.get("Content-Length", 0))
+        data = self.rfile.read(length).decode("utf-8")
+        content_type = (
+            self.headers.get("Content-Type", CONTENT_TYPE).split(";")[0].strip()
+        )
+        # Resident facts share the terms of the closure
+        dictionary = None
+        if resident:
+            assert self.server.service.reasoner is not None
+            dictionary = dictionary_of(self.server.service.reasoner.facts)
+        if content_type == "text/n3":
+            return encoded(Graph().parse(data=data, format="n3"), dictionary)
+        return ntriples.loads(data, encoded(dictionary=dictionary))
+
+    def _respond(
+        self, status: int, triples: Iterable[Triple] = (), message: str = ""
+    ) -> None:
+        out = StringIO(message)
+        if message == "":
+            ntriples.write(triples, out)
+        body = out.getvalue().encode("utf-8")
+        self.send_response(status)
+        self.send_header(
+            "Content-Type", CONTENT_TYPE if message == "" else "text/plain"
+        )
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _handle(self, method: str) -> None:
+        url = urlsplit(self.path)
+        service = self.server.service
+        resident = (method, url.path) in (
+            ("POST", "/facts"),
+            ("POST", "/retract"),
+            ("GET", "/query"),
+        )
+        try:
+            if resident and service.reasoner is None:
+                self._respond(409, message="no closure is kept\n")
+            elif method == "POST" and url.path == "/infer":
+                self._respond(200, service.infer(self._facts()))
+            elif method == "POST" and url.path == "/facts":
+                self._respond(200, service.add(self._facts(resident)))
+            elif method == "POST" and url.path == "/retract":
+                self._respond(200, service.remove(self._facts(resident)))
+            elif method == "GET" and url.path == "/query":
+                query = parse_qs(url.query)
+                pattern = tuple(
+                    ntriples.parse_term(query[key][0])
+                    if query.get(key, [""])[0] != ""
+                    else None
+                    for key in ("s", "p", "o")
+                )
+                self._respond(200, service.query(pattern))  # type: ignore[arg-type]
+            else:
+                self._respond(404, message=f"no {method} {url.path}\n")
+        except (ValueError, SyntaxError) as e:
+            self._respond(400, message=f"{e}\n")
+        except Exception as e:
+            # Keep serving: report the failure instead of dropping the connection
+            logger.exception("%s %s failed", method, url.path)
+            self._respond(500, message=f"{e}\n")
+
+    def do_GET(self) -> None:
+        self._handle("GET")
+
+    def do_POST(self) -> None:
+        self._handle("POST")
+
+    def log_message(self, format: str, *args: Any) -> None:  # noqa: A002, ANN401
+        logger.debug(format, *args)
+
+
+class _Server(HTTPServer):
+    def __init__(self, service: Service, address: tuple[str, int]) -> None:
+        super().__init__(address, _Handler)
+        self.service = service
+
+
+def make_server(
+    service: Service, host: str = "127.0.0.1", port: int = 8035
+) -> HTTPServer:
+    """Return an HTTP server answering with the service, port 0 for any free one."""
+    return _Server(service, (host, port))
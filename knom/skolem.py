@@ -0,0 +1,125 @@
+"""Names of the blank nodes concluded by rule firings.
+
+A firing names the blank nodes of the conclusion after a single hash of its
+bindings, so that firing the rule again on the same match concludes the
+same triples. Variables and their values enter the hash through digests
+of their terms, computed once per term, formulas by their content. The
+blank nodes of a conclusion and the order of its bindings are worked out
+once per compiled conclusion, see `Names`.
+
+With `legacy` set, names are derived as they used to be, hashing all the
+bindings written out as text once per blank node.
+"""
+from collections.abc import Iterator
+from contextlib import contextmanager
+from functools import lru_cache
+from hashlib import sha256
+
+from rdflib import BNode, Graph, Literal, URIRef, Variable
+from rdflib.term import Node
+
+from knom.typing import Bindings
+
+# Name blank nodes like earlier releases did
+legacy = False
+
+# Tags keeping the digests of different kinds of terms apart
+_TAGS = {URIRef: b"u", Literal: b"l", BNode: b"b", Variable: b"v"}
+_UNBOUND = b"\x00" * 32
+
+
+@contextmanager
+def legacy_names() -> Iterator[None]:
+    """Name concluded blank nodes like earlier releases within the block."""
+    global legacy  # noqa: PLW0603
+    previous = legacy
+    legacy = True
+    try:
+        yield
+    finally:
+        legacy = previous
+
+
+def _formula_digest(formula: Graph) -> bytes:
+    clauses = sorted(
+        b"".join(term_digest(node) for node in triple) for triple in formula
+    )
+    return sha256(b"f" + b"".join(clauses)).digest()
+
+
+@lru_cache(maxsize=1 << 16)
+def _digest(node: Node) -> bytes:
+    return sha256(_TAGS.get(type(node), b"t") + node.n3().encode("utf-8")).digest()
+
+
+def term_digest(node: Node | None) -> bytes:
+    """Return a 32 bytes digest of the term, formulas by their content."""
+    if node is None:
+        return _UNBOUND
+    if isinstance(node, Graph):
+        return _formula_digest(node)
+    return _digest(node)
+
+
+def _bnodes(body: Graph) -> tuple[tuple[BNode, str], ...]:
+    """Return the blank nodes of the conclusion with the suffixes of their names."""
+    bnodes = sorted(
+        {node for triple in body for node in triple if isinstance(node, BNode)}
+    )
+    return tuple((node, f"-{node}") for node in bnodes)
+
+
+def _order(
+    keys: tuple[Variable | BNode, ...],
+) -> tuple[tuple[Variable | BNode, bytes], ...]:
+    return tuple((node, term_digest(node)) for node in sorted(keys))
+
+
+class Names:
+    """Names of the blank nodes of a conclusion, for the firings of its rule."""
+
+    __slots__ = ("body", "bnodes", "orders")
+
+    def __init__(self, body: Graph) -> None:
+        self.body = body
+        self.bnodes = _bnodes(body)
+        # Firings of a plan bind the same variables in the same order
+        self.orders: dict[
+            tuple[Variable | BNode, ...], tuple[tuple[Variable | BNode, bytes], ...]
+        ] = {}
+
+    def of(self, bindings: Bindings) -> Bindings:
+        """Return names for the blank nodes the bindings leave unbound."""
+        if legacy:
+            return _legacy_bnode_names(self.body, bindings)
+        unbound = [
+            (node, suffix) for node, suffix in self.bnodes if node not in bindings
+        ]
+        if len(unbound) == 0:
+            return {}
+        layout = tuple(bindings)
+        keys = self.orders.get(layout)
+        if keys is None:
+            keys = self.orders[layout] = _order(layout)
+        firing = sha256(
+            b"".join(key + term_digest(bindings[node]) for node, key in keys)
+        ).hexdigest()
+        return {node: BNode(firing + suffix) for node, suffix in unbound}
+
+
+def bnode_names(body: Graph, bindings: Bindings) -> Bindings:
+    """Return names for the conclusion's blank nodes the bindings leave unbound."""
+    return Names(body).of(bindings)
+
+
+def _legacy_bnode_names(body: Graph, bindings: Bindings) -> Bindings:
+    identifiers = [f"{node}:{binding}" for node, binding in sorted(bindings.items())]
+    base_path = "-".join(identifiers)
+    names: Bindings = {}
+    for triple in body:
+        for node in triple:
+            if isinstance(node, BNode) and node not in bindings:
+                path = f"{base_path}-{node}"
+                id_ = sha256(path.encode("utf-8")).hexdigest()
+                names[node] = BNode(id_)
+    return names
@@ -0,0 +1,107 @@
+from itertools import chain
+
+from rdflib import BNode, Graph, Variable
+from rdflib.term import Node
+
+from knom.graph import UnionStore
+from knom.store import EncodedStore
+from knom.typing import Triple
+
+# Replan once some predicate's triple count changed by this factor...
+REPLAN_FACTOR = 2
+# ...unless both the old and the new counts are below this
+REPLAN_MIN_COUNT = 64
+
+
+class Statistics:
+    """Triples per predicate and distinct subjects and objects per predicate."""
+
+    def __init__(self) -> None:
+        self.size = 0
+        self.counts: dict[Node, int] = {}
+        # (predicate, 0) for subjects, (predicate, 2) for objects
+        self.distinct: dict[tuple[Node, int], int] = {}
+
+    @classmethod
+    def of(cls, g: Graph) -> "Statistics":
+        statistics = cls()
+        store = g.store
+        if isinstance(store, UnionStore):
+            for layer in store.layers:
+                statistics.update(cls.of(layer))
+        elif isinstance(store, EncodedStore):
+            decode = store.dictionary.decode
+            for id_, by_o in store.pos.items():
+                predicate = decode(id_)
+                count = sum(len(subjects) for subjects in by_o.values())
+                statistics.size += count
+                statistics.counts[predicate] = count
+                statistics.distinct[predicate, 0] = len(
+                    set(chain.from_iterable(by_o.values()))
+                )
+                statistics.distinct[predicate, 2] = len(by_o)
+        else:
+            values: dict[tuple[Node, int], set[Node]] = {}
+            for s, p, o in g:
+                statistics.size += 1
+                statistics.counts[p] = statistics.counts.get(p, 0) + 1
+                values.setdefault((p, 0), set()).add(s)
+                values.setdefault((p, 2), set()).add(o)
+            for key, nodes in values.items():
+                statistics.distinct[key] = len(nodes)
+        return statistics
+
+    def copy(self) -> "Statistics":
+        statistics = Statistics()
+        statistics.update(self)
+        return statistics
+
+    def update(self, other: "Statistics") -> None:
+        """Add the statistics of disjoint triples, distinct counts become bounds."""
+        self.size += other.size
+        for p, count in other.counts.items():
+            self.counts[p] = self.counts.get(p, 0) + count
+        for key, count in other.distinct.items():
+            self.distinct[key] = self.distinct.get(key, 0) + count
+
+    def subtract(self, other: "Statistics") -> None:
+        """Remove the statistics of triples gone, distinct counts stay upper bounds."""
+        self.size -= other.size
+        for p, count in other.counts.items():
+            left = self.counts.get(p, 0) - count
+            if left > 0:
+                self.counts[p] = left
+                for pos in (0, 2):
+                    if (p, pos) in self.distinct:
+                        self.distinct[p, pos] = min(self.distinct[p, pos], left)
+            else:
+                self.counts.pop(p, None)
+                self.distinct.pop((p, 0), None)
+                self.distinct.pop((p, 2), None)
+
+    def moved(self, other: "Statistics") -> bool:
+        for p in self.counts.keys() | other.counts.keys():
+            a = self.counts.get(p, 0)
+            b = other.counts.get(p, 0)
+            if max(a, b) < REPLAN_MIN_COUNT:
+                continue
+            if max(a, b) >= REPLAN_FACTOR * max(min(a, b), 1):
+                return True
+        return False
+
+    def estimate(self, clause: Triple, bound: set[Variable | BNode]) -> float:
+        """Estimate the number of facts matching the clause."""
+        s, p, o = clause
+        if isinstance(p, Variable | BNode):
+            if len(self.counts) == 0:
+                return 0
+            # Unknown predicate, assume an average one
+            total = self.size / len(self.counts) if p in bound else self.size
+            return total / (2 if s in bound or o in bound else 1)
+        count: float = self.counts.get(p, 0)
+        for pos, node in ((0, s), (2, o)):
+            if isinstance(node, Graph):
+                continue
+            if not isinstance(node, Variable | BNode) or node in bound:
+                count /= max(self.distinct.get((p, pos), 1), 1)
+        return count
@@ -0,0 +1,281 @@
+from array import array
+from collections.abc import Iterable, Iterator
+from typing import Any
+
+from rdflib import Graph
+from rdflib.namespace import NamespaceManager
+from rdflib.store import Store
+from rdflib.term import Node
+
+from knom.graph import UnionStore
+from knom.typing import Mask, Triple
+
+# Signed 64-bit ids
+ID_TYPECODE = "q"
+
+
+class Dictionary:
+    """Two-way mapping between terms and dense integer ids."""
+
+    def __init__(self) -> None:
+        self.ids: dict[Node, int] = {}
+        self.terms: list[Node] = []
+
+    def __len__(self) -> int:
+        return len(self.terms)
+
+    def encode(self, term: Node) -> int:
+        id_ = self.ids.get(term)
+        if id_ is None:
+            id_ = len(self.terms)
+            self.ids[term] = id_
+            self.terms.append(term)
+        return id_
+
+    def lookup(self, term: Node) -> int | None:
+        return self.ids.get(term)
+
+    def decode(self, id_: int) -> Node:
+        return self.terms[id_]
+
+
+# Groups of ids larger than this also get an index of their positions, for
+# membership and for removals swapping the last entry in
+LARGE_GROUP = 256
+
+
+def _remove_pair(values: array, a: int, b: int) -> None:
+    for i in range(0, len(values), 2):
+        if values[i] == a and values[i + 1] == b:
+            del values[i : i + 2]
+            return
+    raise KeyError((a, b))
+
+
+def _key(entry: tuple[int, ...]) -> Any:  # noqa: ANN401
+    return entry[0] if len(entry) == 1 else entry
+
+
+def _append(
+    values: array,
+    indexes: dict[Any, dict[Any, int]],
+    group: Any,  # noqa: ANN401
+    entry: tuple[int, ...],
+) -> None:
+    values.extend(entry)
+    width = len(entry)
+    size = len(values) // width
+    if size == LARGE_GROUP + 1:
+        indexes[group] = {
+            _key(tuple(values[i : i + width])): i for i in range(0, len(values), width)
+        }
+    elif size > LARGE_GROUP:
+        indexes[group][_key(entry)] = len(values) - width
+
+
+def _discard(
+    values: array,
+    indexes: dict[Any, dict[Any, int]],
+    group: Any,  # noqa: ANN401
+    entry: tuple[int, ...],
+) -> None:
+    positions = indexes.get(group)
+    if positions is None:
+        if len(entry) == 1:
+            values.remove(entry[0])
+        else:
+            _remove_pair(values, *entry)
+        return
+    width = len(entry)
+    i = positions.pop(_key(entry))
+    last = len(values) - width
+    if i != last:
+        moved = values[last:]
+        values[i : i + width] = moved
+        positions[_key(tuple(moved))] = i
+    del values[last:]
+    if len(values) // width == LARGE_GROUP:
+        del indexes[group]
+
+
+class EncodedStore(Store):
+    """Store keeping dictionary-encoded triples in array-backed indexes.
+
+    SPO and POS map two ids to an array of the third one, OSP maps an
+    object to an array of interleaved subject and predicate ids. Large
+    groups are indexed by position, so that removing from them takes
+    constant time, at the cost of their order. Several stores can share one
+    dictionary, so their ids can be compared directly.
+    """
+
+    context_aware = False
+    formula_aware = False
+    graph_aware = False
+
+    def __init__(self, dictionary: Dictionary | None = None) -> None:
+        super().__init__()
+        self.dictionary = Dictionary() if dictionary is None else dictionary
+        self.spo: dict[int, dict[int, array]] = {}
+        self.pos: dict[int, dict[int, array]] = {}
+        self.osp: dict[int, array] = {}
+        # Positions in the large groups of SPO, POS and OSP
+        self.large: dict[tuple[int, int], dict[int, int]] = {}
+        self.large_pos: dict[tuple[int, int], dict[int, int]] = {}
+        self.large_osp: dict[int, dict[tuple[int, int], int]] = {}
+        self.size = 0
+
+    def contains_ids(self, s: int, p: int, o: int) -> bool:
+        objects = self.spo.get(s, {}).get(p)
+        if objects is None:
+            return False
+        if len(objects) > LARGE_GROUP:
+            return o in self.large[s, p]
+        return o in objects
+
+    def add_ids(self, s: int, p: int, o: int) -> bool:
+        if self.contains_ids(s, p, o):
+            return False
+        objects = self.spo.setdefault(s, {}).setdefault(p, array(ID_TYPECODE))
+        _append(objects, self.large, (s, p), (o,))
+        subjects = self.pos.setdefault(p, {}).setdefault(o, array(ID_TYPECODE))
+        _append(subjects, self.large_pos, (p, o), (s,))
+        _append(self.osp.setdefault(o, array(ID_TYPECODE)), self.large_osp, o, (s, p))
+        self.size += 1
+        return True
+
+    def remove_ids(self, s: int, p: int, o: int) -> bool:
+        if not self.contains_ids(s, p, o):
+            return False
+        objects = self.spo[s][p]
+        _discard(objects, self.large, (s, p), (o,))
+        if len(objects) == 0:
+            del self.spo[s][p]
+            if len(self.spo[s]) == 0:
+                del self.spo[s]
+        subjects = self.pos[p][o]
+        _discard(subjects, self.large_pos, (p, o), (s,))
+        if len(subjects) == 0:
+            del self.pos[p][o]
+            if len(self.pos[p]) == 0:
+                del self.pos[p]
+        pairs = self.osp[o]
+        _discard(pairs, self.large_osp, o, (s, p))
+        if len(pairs) == 0:
+            del self.osp[o]
+        self.size -= 1
+        return True
+
+    def triples_ids(  # noqa: C901, PLR0912
+        self, s: int | None, p: int | None, o: int | None
+    ) -> Iterator[tuple[int, int, int]]:
+        if s is not None:
+            by_s = self.spo.get(s)
+            if by_s is None:
+                return
+            if p is not None:
+                if o is not None:
+                    if self.contains_ids(s, p, o):
+                        yield s, p, o
+                else:
+                    for o_ in by_s.get(p, ()):
+                        yield s, p, o_
+            elif o is not None:
+                pairs = self.osp.get(o, ())
+                if len(pairs) // 2 > len(by_s):
+                    # Fewer predicates of the subject than pairs of the object
+                    for p_ in tuple(by_s):
+                        if self.contains_ids(s, p_, o):
+                            yield s, p_, o
+                    return
+                for i in range(0, len(pairs), 2):
+                    if pairs[i] == s:
+                        yield s, pairs[i + 1], o
+            else:
+                for p_, objects in tuple(by_s.items()):
+                    for o_ in objects:
+                        yield s, p_, o_
+        elif p is not None:
+            by_p = self.pos.get(p)
+            if by_p is None:
+                return
+            if o is not None:
+                for s_ in by_p.get(o, ()):
+                    yield s_, p, o
+            else:
+                for o_, subjects in tuple(by_p.items()):
+                    for s_ in subjects:
+                        yield s_, p, o_
+        elif o is not None:
+            pairs = self.osp.get(o, ())
+            for i in range(0, len(pairs), 2):
+                yield pairs[i], pairs[i + 1], o
+        else:
+            for s_, by_s in tuple(self.spo.items()):
+                for p_, objects in tuple(by_s.items()):
+                    for o_ in objects:
+                        yield s_, p_, o_
+
+    def _encode_mask(self, triple_pattern: Mask) -> tuple[int | None, ...] | None:
+        ids: list[int | None] = []
+        for node in triple_pattern:
+            if node is None:
+                ids.append(None)
+                continue
+            id_ = self.dictionary.lookup(node)
+            if id_ is None:
+                return None
+            ids.append(id_)
+        return tuple(ids)
+
+    def add(
+        self, triple: Triple, context: Any = None, quoted: bool = False  # noqa: ANN401, ARG002
+    ) -> None:
+        encode = self.dictionary.encode
+        self.add_ids(encode(triple[0]), encode(triple[1]), encode(triple[2]))
+
+    def remove(self, triple_pattern: Mask, context: Any = None) -> None:  # noqa: ANN401, ARG002
+        ids = self._encode_mask(triple_pattern)
+        if ids is None:
+            return
+        for triple in list(self.triples_ids(*ids)):
+            self.remove_ids(*triple)
+
+    def triples(
+        self, triple_pattern: Mask, context: Any = None  # noqa: ANN401, ARG002
+    ) -> Iterator[tuple[Triple, Iterator]]:
+        ids = self._encode_mask(triple_pattern)
+        if ids is None:
+            return
+        terms = self.dictionary.terms
+        for s, p, o in self.triples_ids(*ids):
+            yield (terms[s], terms[p], terms[o]), iter(())
+
+    def __len__(self, context: Any = None) -> int:  # noqa: ANN401
+        return self.size
+
+
+def encoded(
+    triples: Iterable[Triple] = (),
+    dictionary: Dictionary | None = None,
+    namespace_manager: NamespaceManager | None = None,
+) -> Graph:
+    """Return a graph backed by an EncodedStore, filled with the triples."""
+    g = Graph(store=EncodedStore(dictionary), namespace_manager=namespace_manager)
+    store = g.store
+    assert isinstance(store, EncodedStore)
+    for triple in triples:
+        store.add(triple)
+    return g
+
+
+def dictionary_of(g: Graph) -> Dictionary | None:
+    """Return the dictionary of an encoded graph or of an encoded union layer."""
+    store = g.store
+    if isinstance(store, EncodedStore):
+        return store.dictionary
+    if isinstance(store, UnionStore):
+        for layer in store.layers:
+            dictionary = dictionary_of(layer)
+            if dictionary is not None:
+                return dictionary
+    return None
@@ -1,6 +1,6 @@
 import logging
-from collections.abc import Iterable
-from typing import cast
+from collections.abc import Callable, Iterable, Iterator
+from typing import TYPE_CHECKING, cast
 
 from rdflib import BNode, Graph, Variable
 from rdflib.graph import QuotedGraph
@@ -8,15 +8,32 @@ from rdflib.namespace import NamespaceManager
 from rdflib.term import Node
 
 from knom import (
+    delta_rule,
     single_rule,
+    trace,
 )
 from knom.builtins import BUILTINS
+from knom.graph import union
+from knom.plan import (
+    NEGATION_PREDICATE,
+    Plans,
+    RulePlan,
+    compile_rules,
+    get_plan,
+    variables,
+)
+from knom.statistics import Statistics
+from knom.store import dictionary_of, encoded
 from knom.typing import Bindings, Rule, RulesDependencies, Triple
 from knom.util import LOG, add_triples, get_body, get_head
 
+if TYPE_CHECKING:
+    from knom.program import Program
+
 logger = logging.getLogger(__name__)
 
-NEGATION_PREDICATE = LOG.notIncludes
+# Builtins that may consult the whole document rather than their arguments
+SCOPED_BUILTINS = {LOG.includes, LOG.forAllIn}
 
 
 def node_depends(body_node: Node, head_node: Node, bnodes: Bindings) -> bool:
@@ -103,8 +120,27 @@ def head_depends_on_body(
     return True
 
 
+def dependency_head(rule: Rule) -> Iterable[Triple] | Variable | BNode:
+    """Return the premise with the formulas negated over the document inlined.
+
+    The rules producing a negated formula have to be evaluated before the
+    negation is checked.
+    """
+    head = get_head(rule)
+    if not isinstance(head, Graph) or not is_negative(rule):
+        return head
+    clauses: list[Triple] = []
+    for s, p, o in head:
+        if p == NEGATION_PREDICATE and isinstance(o, Graph):
+            if not isinstance(s, Graph):
+                clauses.extend(o)
+        else:
+            clauses.append((s, p, o))
+    return clauses
+
+
 def firing_rules(rule_with_head: Rule, rules_with_body: Graph) -> set[Rule]:
-    head = get_head(rule_with_head)
+    head = dependency_head(rule_with_head)
     result = set()
     for rule_with_body in rules_with_body:
         if head_depends_on_body(head, get_body(rule_with_body)):
@@ -112,10 +148,107 @@ def firing_rules(rule_with_head: Rule, rules_with_body: Graph) -> set[Rule]:
     return result
 
 
+# Premise or conclusion clauses with anonymous variables, sorted
+Shape = tuple[Triple, ...]
+
+# Variables all depend alike, whatever their names
+_ANY = Variable("_")
+
+
+def _shape(clauses: Iterable[Triple]) -> Shape:
+    return tuple(
+        sorted(
+            (
+                tuple(_ANY if isinstance(n, Variable) else n for n in clause)
+                for clause in clauses
+            ),  # type: ignore[misc]
+            key=str,
+        )
+    )
+
+
+def _covers(head: Shape, body: Shape, bnodes: frozenset, failed: set) -> bool:
+    """Return whether clause_dependencies yields anything, visiting each state once."""
+    if len(body) == 0:
+        return True
+    if len(head) == 0:
+        return len(bnodes) == 0
+    state = (head, body, bnodes)
+    if state in failed:
+        return False
+    for i, body_triple in enumerate(body):
+        # Equal clauses lead to the same states
+        if i > 0 and body[i - 1] == body_triple:
+            continue
+        for j, head_triple in enumerate(head):
+            if j > 0 and head[j - 1] == head_triple:
+                continue
+            bnodes_ = dict(bnodes)
+            if depends(body_triple, head_triple, bnodes_) and _covers(
+                head[:j] + head[j + 1 :],
+                body[:i] + body[i + 1 :],
+                frozenset(bnodes_.items()),
+                failed,
+            ):
+                return True
+    failed.add(state)
+    return False
+
+
 def get_rules_dependencies(rules: Graph) -> RulesDependencies:
+    """Map each rule to the rules whose conclusions its premise depends on.
+
+    Same as `firing_rules` for each rule, but premises are only compared
+    with the conclusions sharing a predicate with them, and each pair of
+    premise and conclusion shapes is compared once.
+    """
+    order = [cast(Rule, rule) for rule in rules]
+    everything = range(len(order))
+    # Rules by conclusion predicate, and the ones that may conclude any
+    by_predicate: dict[Node, list[int]] = {}
+    anywhere: set[int] = set()
+    bodies: list[Shape | None] = []
+    for i, rule in enumerate(order):
+        body = get_body(rule)
+        if not isinstance(body, Graph) or len(body) == 0:
+            anywhere.add(i)
+            bodies.append(None)
+            continue
+        bodies.append(_shape(body))
+        for _, p, _ in body:
+            if isinstance(p, Variable | BNode):
+                anywhere.add(i)
+            elif p not in BUILTINS:
+                by_predicate.setdefault(p, []).append(i)
+
+    memo: dict[tuple[Shape, Shape], bool] = {}
+    failed: set = set()
     rules_dependencies: RulesDependencies = {}
-    for rule in rules:
-        rules_dependencies[rule] = firing_rules(cast(Rule, rule), rules)
+    for rule in order:
+        head = dependency_head(rule)
+        candidates: Iterable[int] = everything
+        if not isinstance(head, Variable | BNode) and len(head) > 0:  # type: ignore[arg-type]
+            indexes = set(anywhere)
+            for _, p, _ in head:
+                if isinstance(p, Variable | BNode):
+                    break
+                if p not in BUILTINS:
+                    indexes.update(by_predicate.get(p, ()))
+            else:
+                candidates = sorted(indexes)
+        rules_dependencies[rule] = set()
+        head_shape = None if isinstance(head, Variable | BNode) else _shape(head)
+        for i in candidates:
+            body_shape = bodies[i]
+            if head_shape is None or body_shape is None:
+                depending = head_depends_on_body(head, get_body(order[i]))  # type: ignore[arg-type]
+            else:
+                key = (head_shape, body_shape)
+                if key not in memo:
+                    memo[key] = _covers(head_shape, body_shape, frozenset(), failed)
+                depending = memo[key]
+            if depending:
+                rules_dependencies[rule].add(order[i])
     return rules_dependencies
 
 
@@ -170,6 +303,18 @@ def stratify_rules(rules: Graph, rules_dependencies: RulesDependencies | None =
                         rule, rules_dependencies, state, rules.namespace_manager)
 
 
+def premise_predicates(formula: Graph) -> Iterable[Node | None]:
+    """Yield the predicates a premise may match, None for any, nested ones included."""
+    for s, p, o in formula:
+        for node in (s, o):
+            if isinstance(node, Graph):
+                yield from premise_predicates(node)
+        if p in SCOPED_BUILTINS:
+            yield None
+        elif p not in BUILTINS:
+            yield None if isinstance(p, Variable | BNode) else p
+
+
 def is_negative(rule: Rule) -> bool:
     head  = get_head(rule)
     if isinstance(head, Graph):
@@ -201,12 +346,24 @@ def get_guard(rule1: Rule, rule2: Rule) -> tuple[Graph, Graph]:
     return guard, rest
 
 
-def with_guard(facts: Graph, rule: Rule) -> Iterable[Triple]:
+def with_guard(
+    facts: Graph, rule: Rule, plan: RulePlan | None = None
+) -> Iterable[Triple]:
+    """Fire a recursive rule producing blank nodes once per round of guard matches.
+
+    Each round fires the rule over the guard facts and the conclusions of
+    the previous round. Matches among guard facts alone fire the same
+    conclusions every round, so only matches of the other conclusions are
+    joined, and the rounds stop once nothing new is inferred.
+    """
     guard, rest = get_guard(rule, rule)
+    if plan is None:
+        plan = RulePlan(rule)
 
-    guard_facts = Graph()
-    old_inferred = Graph()
-    all_inferred = Graph()
+    dictionary = dictionary_of(facts)
+    guard_facts = encoded(dictionary=dictionary)
+    old_inferred = encoded(dictionary=dictionary)
+    all_inferred = encoded(dictionary=dictionary)
 
     assert len(guard) > 0
     logger.debug("querying guard")
@@ -215,20 +372,25 @@ def with_guard(facts: Graph, rule: Rule) -> Iterable[Triple]:
     # so the consecutive recursions will not recreate new nodes once more
     logger.debug("querying rest")
     add_triples(old_inferred, single_rule(facts, (rest, LOG.implies, rest))) # Not really inferred, but still
-
-    logger.debug("guard facts")
-    logger.debug(guard_facts.serialize(format="n3"))
+    guarded = encoded(single_rule(guard_facts, rule, plan), dictionary)
 
     for i in range(len(guard_facts) // len(guard)):
-        inferred = Graph()
         logger.debug("round %i %i %i", i, len(guard_facts), len(old_inferred))
-        logger.debug("old inferred")
-        logger.debug(old_inferred.serialize(format="n3"))
-        add_triples(inferred, single_rule(guard_facts + old_inferred, rule))
-        old_len = len(all_inferred)
-        all_inferred += inferred
-        if old_len == len(all_inferred):
+        if trace.sinks:
+            trace.emit(
+                "guard_round", round=i, guard_facts=guard_facts, inferred=old_inferred
+            )
+        frontier = encoded(
+            (t for t in old_inferred if t not in guard_facts), dictionary
+        )
+        inferred = encoded(guarded, dictionary)
+        add_triples(
+            inferred, delta_rule(union(guard_facts, old_inferred), frontier, rule, plan)
+        )
+        new = encoded((t for t in inferred if t not in all_inferred), dictionary)
+        if len(new) == 0:
             break
+        all_inferred += new
         old_inferred = inferred
     yield from all_inferred
 
@@ -255,7 +417,21 @@ def create_positive_rule(rule: Rule) -> tuple[Rule, Rule]:
     return positive_rule, non_negative_rule
 
 
-def negative_rule(facts: Graph, rule: Rule) -> Iterable[Triple]:
+def negative_rule(
+    facts: Graph, rule: Rule, plan: RulePlan | None = None
+) -> Iterable[Triple]:
+    """Fire the rule for the premise matches its negated formulas do not match.
+
+    The negations are anti-joins of the premise plan. Recursive rules
+    producing blank nodes are still evaluated with guards, firing the rule
+    without negations and removing what the negated formulas would fire.
+    """
+    body = get_body(rule)
+    has_bnodes = any(isinstance(n, BNode) for triple in body for n in triple)
+    if not has_bnodes or not head_depends_on_body(get_head(rule), body):
+        yield from single_rule(facts, rule, plan)
+        return
+
     positive_rule, non_negative_rule = create_positive_rule(rule)
 
     rules_dependencies: RulesDependencies = {
@@ -273,72 +449,297 @@ def negative_rule(facts: Graph, rule: Rule) -> Iterable[Triple]:
     yield from all_results - results
 
 
-def stratified_rule(facts: Graph, rule: Triple, rules_dependencies: RulesDependencies) -> Iterable[Triple]:
+def rule_method(
+    rule: Rule, rules_dependencies: RulesDependencies
+) -> Callable[[Graph, Rule, RulePlan], Iterable[Triple]]:
     recursive = rule in rules_dependencies[rule]
     has_bnodes = any(isinstance(n, BNode) for triple in get_body(rule) for n in triple)
     if is_negative(rule):
-        method = negative_rule
-    else:
-        head = get_head(rule)
-        if len(head) > 0 and recursive and has_bnodes and not isinstance(head, Variable | BNode):
-            method = with_guard
-        else:
-            method = single_rule
+        return negative_rule
+    head = get_head(rule)
+    if (
+        len(head) > 0
+        and recursive
+        and has_bnodes
+        and not isinstance(head, Variable | BNode)
+    ):
+        return with_guard
+    return single_rule
+
+
+def is_incremental(rule: Rule, rules_dependencies: RulesDependencies) -> bool:
+    if rule_method(rule, rules_dependencies) is not single_rule:
+        return False
+    head = get_head(rule)
+    return not isinstance(head, Graph) or not any(
+        p in SCOPED_BUILTINS for _, p, _ in head
+    )
+
+
+def concludes_fresh_nodes(rule: Rule) -> bool:
+    """Return whether the conclusion has nodes the premise does not bind.
+
+    Each firing of such a rule names those nodes anew, so it is fired once
+    rather than to a fixpoint.
+    """
+    head = get_head(rule)
+    body = get_body(rule)
+    if not isinstance(body, Graph):
+        return False
+    premise = set(variables(head))
+    return any(
+        isinstance(node, BNode) or node not in premise for node in variables(body)
+    )
+
+
+def stratified_rule(
+    facts: Graph,
+    rule: Triple,
+    rules_dependencies: RulesDependencies,
+    plans: Plans | None = None,
+) -> Iterable[Triple]:
+    method = rule_method(cast(Rule, rule), rules_dependencies)
     logger.debug("using %s", method)
-    yield from method(facts, rule)
+    yield from method(facts, cast(Rule, rule), get_plan(rule, plans))
+
 
+def _add_counted(g: Graph, triples: Iterable[Triple]) -> int:
+    count = 0
+    for triple in triples:
+        g.add(triple)
+        count += 1
+    return count
 
-def walk(facts: Graph, strata: list[Rule], triggered_rules: RulesDependencies) -> Iterable[Triple]:
+
+def walk(
+    facts: Graph,
+    strata: list[Rule],
+    triggered_rules: RulesDependencies,
+    semi_naive: bool = True,
+    plans: Plans | None = None,
+    delta: Graph | None = None,
+) -> Iterable[Triple]:
     rules = strata.copy()
-    all_inferred = Graph()
+    dictionary = dictionary_of(facts)
+    all_inferred = encoded(dictionary=dictionary)
+    # Inferred triples that were already among the facts
+    rederived = encoded(dictionary=dictionary)
+    closure = union(facts, all_inferred)
+    # Triples inferred since the rule was last evaluated, for semi-naive mode
+    deltas: dict[Rule, Graph] = {}
+    if delta is not None:
+        # Only the consequences of delta are wanted, the facts are closed already
+        for rule in rules:
+            if is_incremental(rule, triggered_rules):
+                deltas[rule] = delta
     while len(rules) > 0:
         rule = rules.pop(0)
-        new_inferred = Graph(namespace_manager=facts.namespace_manager)
-        add_triples(new_inferred, stratified_rule(facts + all_inferred, rule, triggered_rules))
-        logger.debug("inferred")
-        logger.debug(new_inferred.serialize(format="n3"))
-        old_len = len(all_inferred)
-        all_inferred += new_inferred
-        if len(all_inferred) == old_len:
+        new_inferred = encoded(
+            dictionary=dictionary, namespace_manager=facts.namespace_manager
+        )
+        delta = deltas.pop(rule, None)
+        if trace.sinks:
+            trace.emit("rule_start", rule=rule)
+        if semi_naive and delta is not None:
+            logger.debug("delta %i", len(delta))
+            fired = _add_counted(
+                new_inferred, delta_rule(closure, delta, rule, get_plan(rule, plans))
+            )
+        else:
+            fired = _add_counted(
+                new_inferred, stratified_rule(closure, rule, triggered_rules, plans)
+            )
+        new = encoded(dictionary=dictionary)
+        for triple in new_inferred:
+            if triple in facts:
+                rederived.add(triple)
+            elif triple not in all_inferred:
+                new.add(triple)
+        all_inferred += new
+        logger.debug("inferred %i new %i", len(new_inferred), len(new))
+        if trace.sinks:
+            method = (
+                delta_rule
+                if semi_naive and delta is not None
+                else rule_method(rule, triggered_rules)
+            )
+            trace.emit(
+                "rule_evaluated",
+                rule=rule,
+                method=method.__name__,
+                inferred=new_inferred,
+                fired=fired,
+                new=len(new),
+            )
+        if len(new) == 0:
             continue
         for triggered in triggered_rules[rule]:
             if triggered not in strata:
                 continue
             if triggered in rules:
                 rules.remove(triggered)
+                if triggered in deltas:
+                    deltas[triggered] = encoded(
+                        union(deltas[triggered], new), dictionary
+                    )
+            elif is_incremental(triggered, triggered_rules):
+                deltas[triggered] = new
             rules.insert(0, triggered)
     yield from all_inferred
+    yield from rederived
 
 
-def _stratified(facts: Graph, rules: Graph) -> Iterable[Triple]:
-    closure = Graph()
-    closure += facts # TODO: avoid copying facts, important for real life scenarios
-    rules_dependencies = get_rules_dependencies(rules)
-
+def get_triggered_rules(rules_dependencies: RulesDependencies) -> RulesDependencies:
+    """Invert the dependencies, mapping each rule to the rules its conclusions fire."""
     triggered_rules: RulesDependencies = {}
     for rule, firing_rules in rules_dependencies.items():
         for firing_rule in firing_rules:
             if firing_rule not in triggered_rules:
                 triggered_rules[firing_rule] = set()
             triggered_rules[firing_rule].add(rule)
-
-    for i, strata in enumerate(stratify_rules(rules, rules_dependencies)):
-        logger.debug("strata %i rules %i", i, len(strata))
-        g = Graph(namespace_manager=rules.namespace_manager)
-        add_triples(g, strata)
-        logger.debug(g.serialize(format="n3"))
-
-        new_inferred = Graph(namespace_manager=facts.namespace_manager)
-        if len(strata) > 1:
-            add_triples(new_inferred, walk(closure, strata, triggered_rules))
-        else:
-            add_triples(new_inferred, stratified_rule(closure, next(iter(strata)), rules_dependencies))
-        yield from new_inferred
-        closure += new_inferred
-        logger.debug("inferred")
-        logger.debug(new_inferred.serialize(format="n3"))
+    return triggered_rules
 
 
-def stratified(facts: Graph, rules: Graph) -> Graph:
+def evaluate_stratum(  # noqa: PLR0913
+    closure: Graph,
+    strata: list[Rule],
+    rules_dependencies: RulesDependencies,
+    triggered_rules: RulesDependencies,
+    semi_naive: bool = True,
+    plans: Plans | None = None,
+    delta: Graph | None = None,
+) -> Graph:
+    """Infer the conclusions of a stratum over the closure of the earlier ones.
+
+    With a delta, only the consequences of those triples (already part of
+    the closure) are inferred where the rules allow it.
+    """
+    new_inferred = encoded(
+        dictionary=dictionary_of(closure), namespace_manager=closure.namespace_manager
+    )
+    rule = strata[0]
+    recursive = rule in rules_dependencies[rule]
+    # Rules matching any statement or naming nodes anew are fired once
+    if len(strata) > 1 or (
+        recursive
+        and isinstance(get_head(rule), Graph)
+        and rule_method(rule, rules_dependencies) is single_rule
+        and not concludes_fresh_nodes(rule)
+    ):
+        add_triples(
+            new_inferred,
+            walk(closure, strata, triggered_rules, semi_naive, plans, delta),
+        )
+        return new_inferred
+
+    if trace.sinks:
+        trace.emit("rule_start", rule=rule)
+    incremental = (
+        semi_naive and delta is not None and is_incremental(rule, rules_dependencies)
+    )
+    if incremental:
+        assert delta is not None
+        fired = _add_counted(
+            new_inferred, delta_rule(closure, delta, rule, get_plan(rule, plans))
+        )
+    else:
+        fired = _add_counted(
+            new_inferred, stratified_rule(closure, rule, rules_dependencies, plans)
+        )
+    if trace.sinks:
+        method = delta_rule if incremental else rule_method(rule, rules_dependencies)
+        new = sum(1 for triple in new_inferred if triple not in closure)
+        trace.emit(
+            "rule_evaluated",
+            rule=rule,
+            method=method.__name__,
+            inferred=new_inferred,
+            fired=fired,
+            new=new,
+        )
+    return new_inferred
+
+
+def _stratified(
+    facts: Graph,
+    rules: Graph,
+    semi_naive: bool = True,
+    batch: bool = False,
+    program: "Program | None" = None,
+) -> Iterable[Triple]:
+    inferred = encoded(dictionary=dictionary_of(facts))
+    closure = union(facts, inferred)
+    # Facts inferred again, yielded once like the other triples
+    rederived = encoded(dictionary=dictionary_of(facts))
+    statistics = Statistics.of(facts)
+    if program is None:
+        rules_dependencies = get_rules_dependencies(rules)
+        triggered_rules = get_triggered_rules(rules_dependencies)
+        all_strata: Iterable[list[Rule]] = stratify_rules(rules, rules_dependencies)  # type: ignore[assignment]
+        planned = statistics.copy()
+        plans = compile_rules(rules, statistics, batch)
+    else:
+        rules = program.rules
+        rules_dependencies = program.rules_dependencies
+        triggered_rules = program.triggered_rules
+        all_strata = program.strata
+        planned = program.statistics
+        plans = program.plans
+        if statistics.moved(planned) or batch != program.batch:
+            logger.debug("replanning the program")
+            planned = statistics.copy()
+            plans = compile_rules(rules, statistics, batch)
+
+    for i, strata in enumerate(all_strata):
+        logger.debug("strata %i rules %i", i, len(strata))
+        if trace.sinks:
+            trace.emit("stratum_start", index=i, rules=strata)
+        new_inferred = evaluate_stratum(
+            closure, strata, rules_dependencies, triggered_rules, semi_naive, plans
+        )
+        layer = encoded(dictionary=dictionary_of(facts))
+        for triple in new_inferred:
+            if triple not in closure:
+                layer.add(triple)
+                yield triple
+            elif triple not in inferred and triple not in rederived:
+                rederived.add(triple)
+                yield triple
+        inferred += layer
+        statistics.update(Statistics.of(layer))
+        if statistics.moved(planned):
+            logger.debug("replanning after strata %i", i)
+            if trace.sinks:
+                trace.emit("replan", index=i)
+            planned = statistics.copy()
+            plans = compile_rules(rules, statistics, batch)
+        logger.debug("inferred %i", len(new_inferred))
+        if trace.sinks:
+            trace.emit("stratum_end", index=i, inferred=new_inferred)
+
+
+def stratified_triples(
+    facts: Graph,
+    rules: Graph,
+    semi_naive: bool = True,
+    batch: bool = False,
+    program: "Program | None" = None,
+) -> Iterator[Triple]:
+    """Yield the triples of `stratified` once each, as their stratum is evaluated."""
+    return iter(_stratified(facts, rules, semi_naive, batch, program))
+
+
+def stratified(
+    facts: Graph,
+    rules: Graph,
+    semi_naive: bool = True,
+    batch: bool = False,
+    program: "Program | None" = None,
+) -> Graph:
+    """Infer the closure of the facts under the rules, stratum by stratum.
+
+    With a `program` compiled from the rules, its analysis is reused and
+    its own copy of the rules is evaluated.
+    """
     g = Graph(namespace_manager=facts.namespace_manager)
-    return add_triples(g, _stratified(facts, rules))
+    return add_triples(g, _stratified(facts, rules, semi_naive, batch, program))
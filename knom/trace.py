@@ -0,0 +1,84 @@
+"""Structured trace events of the reasoner.
+
+Events are only built when a sink is attached, callers check `sinks`
+before assembling the fields:
+
+    if trace.sinks:
+        trace.emit("stratum_end", index=i, inferred=new_inferred)
+
+Events: stratum_start (index, rules), rule_start (rule), step (clause,
+scanned), matched (bindings), rule_evaluated (rule, method, inferred, fired,
+new), guard_round (round, guard_facts, inferred), replan (index),
+stratum_end (index, inferred).
+"""
+import logging
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from typing import Any
+
+from rdflib import Graph
+
+from knom.util import LOG, print_rule, print_triple
+
+logger = logging.getLogger(__name__)
+
+RULE_PREDICATES = (LOG.implies, LOG.impliedBy)
+
+Sink = Callable[[str, dict[str, Any]], None]
+
+sinks: list[Sink] = []
+
+
+def emit(event: str, **fields: Any) -> None:  # noqa: ANN401
+    for sink in sinks:
+        sink(event, fields)
+
+
+def attach(sink: Sink) -> None:
+    sinks.append(sink)
+
+
+def detach(sink: Sink) -> None:
+    sinks.remove(sink)
+
+
+@contextmanager
+def tracing(sink: Sink) -> Iterator[Sink]:
+    attach(sink)
+    try:
+        yield sink
+    finally:
+        detach(sink)
+
+
+class _Fields:
+    """Formats event fields only when the log record is actually emitted."""
+
+    def __init__(self, fields: dict[str, Any]) -> None:
+        self.fields = fields
+
+    def __str__(self) -> str:
+        lines = []
+        for name, value in self.fields.items():
+            if isinstance(value, Graph):
+                value = value.serialize(format="n3")
+            elif isinstance(value, list):
+                value = "\n".join(print_rule(rule) for rule in value)
+            elif isinstance(value, tuple):
+                value = (
+                    print_rule(value)
+                    if value[1] in RULE_PREDICATES
+                    else print_triple(value)
+                )
+            lines.append(f"{name}: {value}")
+        return "\n".join(lines)
+
+
+class LoggingSink:
+    """Sink writing events to the knom.trace logger, serializing graphs lazily."""
+
+    def __init__(self, level: int = logging.DEBUG) -> None:
+        self.level = level
+
+    def __call__(self, event: str, fields: dict[str, Any]) -> None:
+        logger.log(self.level, "%s\n%s", event, _Fields(fields))
@@ -5,6 +5,7 @@ from rdflib import BNode, Graph, Literal, Namespace, URIRef, Variable
 from rdflib.namespace import NamespaceManager
 from rdflib.term import Node
 
+from knom.store import encoded
 from knom.typing import Triple
 
 LOG = Namespace("http://www.w3.org/2000/10/swap/log#")
@@ -117,7 +118,7 @@ def print_rule(rule: Triple) -> str:
 
 def split_rules_and_facts(graph: Graph) -> tuple[Graph, Graph]:
     rules = Graph(namespace_manager=graph.namespace_manager)
-    facts = Graph(namespace_manager=graph.namespace_manager)
+    facts = encoded(namespace_manager=graph.namespace_manager)
     for s, p, o in graph:
         if p in [LOG.implies, LOG.impliedBy]:
             rules.add((s, p, o))
@@ -0,0 +1,148 @@
+from rdflib import Graph, URIRef, Variable
+
+from knom.backward import Prover, query
+from knom.stratified import stratified
+from knom.util import split_rules_and_facts
+
+from . import EX, generate_tests_from_manifests, postprocess
+
+ANCESTORS = """
+@prefix : <http://example.com/>.
+@prefix log: <http://www.w3.org/2000/10/swap/log#>.
+:a :parent :b.
+:b :parent :c.
+:c :parent :a.
+:c :parent :d.
+{ ?x :ancestor ?z } log:impliedBy { ?x :ancestor ?y. ?y :parent ?z }.
+{ ?x :ancestor ?y } log:impliedBy { ?x :parent ?y }.
+"""
+
+NEGATION = """
+@prefix : <http://example.com/>.
+@prefix log: <http://www.w3.org/2000/10/swap/log#>.
+:t1 a :Task.
+:t2 a :Task.
+:t2 :state :Done.
+{ ?t a :Task. [] log:notIncludes { ?t :state :Done } } => { ?t :state :Open }.
+"""
+
+UNBOUND = """
+@prefix : <http://example.com/>.
+:a :a :a.
+{ ?a ?a ?a } => { ?a :x ?b }.
+"""
+
+MANIFESTS = {
+    "test_solve_positive": "tests/n3/positive-non-recursive-rules-manifests.n3",
+    "test_solve_recursive": "tests/n3/recursive-manifests.n3",
+    "test_solve_negative": "tests/n3/negative-manifests.n3",
+    "test_solve_builtins": "tests/n3/builtins-manifests.n3",
+    "test_solve_single_pass": "tests/n3/single-pass-manifests.n3",
+}
+
+
+def pytest_generate_tests(metafunc) -> None:  # noqa: ANN001
+    if metafunc.function.__name__ in MANIFESTS:
+        generate_tests_from_manifests(MANIFESTS[metafunc.function.__name__], metafunc)
+
+
+def _split(document: str) -> tuple[Graph, Graph]:
+    return split_rules_and_facts(Graph().parse(data=document, format="n3"))
+
+
+def test_query_recursive() -> None:
+    rules, facts = _split(ANCESTORS)
+    answers = {
+        b[Variable("z")]
+        for b in query(facts, rules, (EX.d, EX.ancestor, Variable("z")))
+    }
+    assert answers == set()
+    answers = {
+        b[Variable("z")]
+        for b in query(facts, rules, (EX.a, EX.ancestor, Variable("z")))
+    }
+    assert answers == {EX.a, EX.b, EX.c, EX.d}
+
+
+def test_query_does_not_materialize() -> None:
+    rules, facts = _split(ANCESTORS)
+    prover = Prover(facts, rules)
+    assert prover.solve((EX.b, EX.ancestor, EX.d)) == {(EX.b, EX.ancestor, EX.d)}
+    # The ancestors of others were not needed
+    assert all(
+        pattern[0] is not None
+        for pattern, _ in prover.tables
+        if pattern[1] == EX.ancestor
+    )
+
+
+def test_solve_matches_forward() -> None:
+    rules, facts = _split(ANCESTORS)
+    expected = set(facts) | set(stratified(facts, rules))
+    assert Prover(facts, rules).solve((None, None, None)) == expected
+
+
+def test_query_negation() -> None:
+    rules, facts = _split(NEGATION)
+    answers = list(query(facts, rules, (Variable("t"), EX.state, EX.Open)))
+    assert answers == [{Variable("t"): EX.t1}]
+
+
+def test_solve_negation_through_recursion() -> None:
+    rules, facts = _split("""
+        @prefix : <http://example.com/>.
+        @prefix log: <http://www.w3.org/2000/10/swap/log#>.
+        :a :s :b.
+        { ?x :s ?y. [] log:notIncludes { ?x :bad ?y } } => { ?x :p ?y }.
+        { ?x :p ?y } => { ?y :s ?x }.
+    """)
+    assert Prover(facts, rules).solve((None, EX.p, None)) == {
+        (EX.a, EX.p, EX.b),
+        (EX.b, EX.p, EX.a),
+    }
+
+
+def test_solve_variable_premise() -> None:
+    rules, facts = _split("""
+        @prefix : <http://example.com/>.
+        :a :s :b.
+        ?a => { :some :fact :found }.
+    """)
+    assert Prover(facts, rules).solve((None, EX.fact, None)) == {
+        (EX.some, EX.fact, EX.found)
+    }
+
+
+def test_solve_unbound_conclusion() -> None:
+    rules, facts = _split(UNBOUND)
+    answers = list(query(facts, rules, (EX.a, EX.x, Variable("b"))))
+    assert len(answers) == 1
+
+
+def _check_solve(action: URIRef) -> None:
+    """Prove every triple of the document, comparing with forward evaluation."""
+    rules, facts = split_rules_and_facts(Graph().parse(location=action, format="n3"))
+    closure = Graph()
+    for triple in Prover(facts, rules).solve((None, None, None)):
+        closure.add(triple)
+    assert postprocess(closure) == postprocess(facts + stratified(facts, rules))
+
+
+def test_solve_positive(action: URIRef, result: URIRef) -> None:  # noqa: ARG001
+    _check_solve(action)
+
+
+def test_solve_recursive(action: URIRef, result: URIRef) -> None:  # noqa: ARG001
+    _check_solve(action)
+
+
+def test_solve_negative(action: URIRef, result: URIRef) -> None:  # noqa: ARG001
+    _check_solve(action)
+
+
+def test_solve_builtins(action: URIRef, result: URIRef) -> None:  # noqa: ARG001
+    _check_solve(action)
+
+
+def test_solve_single_pass(action: URIRef, result: URIRef) -> None:  # noqa: ARG001
+    _check_solve(action)
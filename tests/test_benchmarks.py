@@ -0,0 +1,32 @@
+from rdflib import Graph
+
+from benchmarks.__main__ import compare, measure
+from benchmarks.workloads import WORKLOADS
+from knom.util import split_rules_and_facts
+
+
+def test_workloads_parse() -> None:
+    for workload in WORKLOADS.values():
+        rules, facts = split_rules_and_facts(
+            Graph().parse(data=workload(4), format="n3")
+        )
+        assert len(rules) > 0
+        assert len(facts) > 0
+
+
+def test_measure() -> None:
+    result = measure("stratified", WORKLOADS["chain"](4), 1)
+    # The chain of 4 classes has 6 transitive links beyond the given ones
+    assert result["output"] == 6
+    assert result["peak_memory"] > 0
+
+
+def test_compare() -> None:
+    baseline = [
+        {"workload": "chain", "size": 4, "operation": "stratified", "seconds": 1.0}
+    ]
+    results = [
+        {"workload": "chain", "size": 4, "operation": "stratified", "seconds": 2.0}
+    ]
+    assert len(compare(results, baseline)) == 1
+    assert compare(baseline, results) == []
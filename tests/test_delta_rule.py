@@ -0,0 +1,34 @@
+from rdflib import Graph
+
+from knom import delta_rule
+from knom.util import LOG
+
+from . import EX, var_a, var_b, var_c
+
+
+def test_delta_rule() -> None:
+    facts = Graph()
+    facts.add((EX.a, EX.p, EX.b))
+    facts.add((EX.b, EX.p, EX.c))
+    delta = Graph()
+    delta.add((EX.c, EX.p, EX.d))
+    facts += delta
+    head = Graph()
+    head.add((var_a, EX.p, var_b))
+    head.add((var_b, EX.p, var_c))
+    body = Graph()
+    body.add((var_a, EX.p, var_c))
+    inferred = set(delta_rule(facts, delta, (head, LOG.implies, body)))
+    assert inferred == {(EX.b, EX.p, EX.d)}
+
+
+def test_delta_rule_empty_delta() -> None:
+    facts = Graph()
+    facts.add((EX.a, EX.p, EX.b))
+    facts.add((EX.b, EX.p, EX.c))
+    head = Graph()
+    head.add((var_a, EX.p, var_b))
+    head.add((var_b, EX.p, var_c))
+    body = Graph()
+    body.add((var_a, EX.p, var_c))
+    assert set(delta_rule(facts, Graph(), (head, LOG.implies, body))) == set()
@@ -0,0 +1,91 @@
+from pathlib import Path
+
+from rdflib import Graph
+
+from knom.documents import documents_of, reason_documents
+from knom.program import Program
+from knom.util import split_rules_and_facts
+
+from . import EX
+
+RULES = """
+@prefix : <http://example.com/>.
+{ ?x :p ?y } => { ?x :anc ?y }.
+{ ?x :anc ?y. ?y :anc ?z } => { ?x :anc ?z }.
+"""
+
+
+def _documents(root: Path) -> None:
+    (root / "sub").mkdir(parents=True)
+    for i in range(3):
+        (root / f"d{i}.n3").write_text(
+            f"@prefix : <http://example.com/>. :a{i} :p :b. :b :p :c."
+        )
+    (root / "sub" / "e.nt").write_text(
+        "<http://example.com/x> <http://example.com/p> <http://example.com/y> .\n"
+    )
+    (root / "bad.n3").write_text("not n3")
+    (root / "notes.txt").write_text("ignored")
+
+
+def test_documents_of(tmp_path: Path) -> None:
+    _documents(tmp_path)
+    relative = [str(r) for _, r in documents_of(tmp_path)]
+    assert relative == ["bad.n3", "d0.n3", "d1.n3", "d2.n3", "sub/e.nt"]
+    manifest = tmp_path / "manifest.txt"
+    manifest.write_text("# documents\nd1.n3\n\nsub/e.nt\n../elsewhere/f.n3\n")
+    assert documents_of(manifest) == [
+        (tmp_path / "d1.n3", Path("d1.n3")),
+        (tmp_path / "sub/e.nt", Path("sub/e.nt")),
+        (
+            tmp_path / "../elsewhere/f.n3",
+            (tmp_path.parent / "elsewhere/f.n3").relative_to(tmp_path.anchor),
+        ),
+    ]
+
+
+def test_reason_documents(tmp_path: Path) -> None:
+    _documents(tmp_path / "in")
+    rules, _ = split_rules_and_facts(Graph().parse(data=RULES, format="n3"))
+    for workers in (1, 2):
+        output = tmp_path / f"out{workers}"
+        results = list(
+            reason_documents(
+                Program(rules), documents_of(tmp_path / "in"), output, workers
+            )
+        )
+        assert [result.ok for result in results] == [False, True, True, True, True]
+        assert results[0].error is not None
+        assert not (output / "bad.n3.nt").exists()
+        inferred = Graph().parse(output / "d1.n3.nt", format="nt")
+        assert set(inferred) == {
+            (EX.a1, EX.anc, EX.b),
+            (EX.b, EX.anc, EX.c),
+            (EX.a1, EX.anc, EX.c),
+        }
+        assert results[1].inferred == 3
+        assert results[1].facts == 2
+        inferred = Graph().parse(output / "sub" / "e.nt.nt", format="nt")
+        assert set(inferred) == {(EX.x, EX.anc, EX.y)}
+
+
+def test_reason_documents_shared_output(tmp_path: Path) -> None:
+    rules, _ = split_rules_and_facts(Graph().parse(data=RULES, format="n3"))
+    for name in ("a", "b"):
+        (tmp_path / name).mkdir()
+        (tmp_path / name / "x.n3").write_text(
+            f"@prefix : <http://example.com/>. :{name} :p :c."
+        )
+    manifest = tmp_path / "m" / "manifest.txt"
+    manifest.parent.mkdir()
+    manifest.write_text("../a/x.n3\n../b/x.n3\n../a/x.n3\n")
+    for workers in (1, 2):
+        output = tmp_path / f"out{workers}"
+        results = list(
+            reason_documents(Program(rules), documents_of(manifest), output, workers)
+        )
+        assert [result.ok for result in results] == [True, True, False]
+        assert results[0].output != results[1].output
+        assert set(Graph().parse(results[1].output, format="nt")) == {
+            (EX.b, EX.anc, EX.c)
+        }
@@ -1,7 +1,22 @@
-from rdflib import Namespace
+from rdflib import Graph, Namespace
+
+from knom.stratified import firing_rules, get_rules_dependencies
+from knom.util import split_rules_and_facts
 
 EX = Namespace("http://example.com/")
 
+RULES = """
+@prefix : <http://example.com/>.
+@prefix log: <http://www.w3.org/2000/10/swap/log#>.
+{ ?x :a ?y. ?y :a ?z } => { ?x :a ?z }.
+{ ?x :a ?y } => { ?y :b _:z }.
+{ _:x :b ?y. _:x :c ?z } => { ?y :c _:w. _:w :b ?z }.
+{ ?x ?p ?y } => { ?y :d ?x }.
+{ ?x :d ?y. [] log:notIncludes { ?y :e ?x } } => { ?x :f ?y }.
+{ ?x :f ?y } => { ?x ?y ?x }.
+{ ?x :g ?y } => { }.
+"""
+
 
 def test_firing_rules() -> None:
     return
@@ -9,3 +24,9 @@ def test_firing_rules() -> None:
 
 def test_firing_rules_with_graph() -> None:
     return
+
+
+def test_get_rules_dependencies() -> None:
+    rules, _ = split_rules_and_facts(Graph().parse(data=RULES, format="n3"))
+    rules_dependencies = get_rules_dependencies(rules)
+    assert rules_dependencies == {rule: firing_rules(rule, rules) for rule in rules}  # type: ignore[arg-type]
@@ -0,0 +1,46 @@
+from rdflib import Literal
+
+from knom import match_rule
+from knom.builtins import MATH
+from knom.store import encoded
+
+from . import EX, var_a, var_b, var_c
+
+FACTS = encoded(
+    [
+        *((EX[f"a{i}"], EX.p, EX[f"b{i % 5}"]) for i in range(40)),
+        *((EX[f"b{i}"], EX.q, Literal(i)) for i in range(5)),
+        (EX.a1, EX.p, EX.a1),
+    ]
+)
+
+
+def _key(bindings: dict) -> frozenset:
+    return frozenset(bindings.items())
+
+
+def test_batch_join() -> None:
+    head = [(var_a, EX.p, var_b), (var_b, EX.q, var_c)]
+    expected = [_key(b) for b in match_rule(head, FACTS)]
+    assert len(expected) == 40
+    assert sorted(_key(b) for b in match_rule(head, FACTS, batch=True)) == sorted(
+        expected
+    )
+
+
+def test_batch_builtin() -> None:
+    head = [
+        (var_a, EX.p, var_b),
+        (var_b, EX.q, var_c),
+        (var_c, MATH.lessThan, Literal(2)),
+    ]
+    expected = [_key(b) for b in match_rule(head, FACTS)]
+    assert len(expected) == 16
+    assert sorted(_key(b) for b in match_rule(head, FACTS, batch=True)) == sorted(
+        expected
+    )
+
+
+def test_batch_same_var() -> None:
+    head = [(var_a, EX.p, var_a)]
+    assert list(match_rule(head, FACTS, batch=True)) == [{var_a: EX.a1}]
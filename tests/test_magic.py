@@ -0,0 +1,92 @@
+from rdflib import Graph, URIRef, Variable
+
+from knom.magic import NIL, is_magic, magic_predicate, magic_rules, magic_stratified
+from knom.stratified import stratified
+from knom.util import split_rules_and_facts
+
+from . import EX
+
+CHAIN = """
+@prefix : <http://example.com/>.
+:c0 :a :c1.
+:c1 :a :c2.
+:c2 :a :c3.
+:c3 :a :c4.
+:d0 :a :d1.
+:d1 :a :d2.
+{ ?x :a ?y. ?y :a ?z } => { ?x :a ?z }.
+"""
+
+NEGATION = """
+@prefix : <http://example.com/>.
+@prefix log: <http://www.w3.org/2000/10/swap/log#>.
+:t1 a :Task; :dependsOn :t2.
+:t2 a :Task; :dependsOn :t3.
+:t3 a :Task.
+:t3 :state :Done.
+{ ?t :dependsOn ?u } => { ?t :requires ?u }.
+{ ?t a :Task. [] log:notIncludes { ?t :state :Done } } => { ?t :state :Open }.
+{ ?t :requires ?u. ?u :state :Open } => { ?t :blockedBy ?u }.
+"""
+
+
+def _split(document: str) -> tuple[Graph, Graph]:
+    return split_rules_and_facts(Graph().parse(data=document, format="n3"))
+
+
+def _answers(g: Graph, goal: tuple) -> set:
+    return set(g.triples(goal))
+
+
+def test_magic_rules_seed() -> None:
+    rules, _ = _split(CHAIN)
+    rewritten, seeds = magic_rules(rules, (EX.c2, EX.a, Variable("z")))
+    assert set(seeds) == {(EX.c2, magic_predicate(EX.a, "bf"), NIL)}
+    assert len(rewritten) > len(rules)
+
+
+def test_magic_rules_unbound_predicate() -> None:
+    rules, _ = _split(CHAIN)
+    rewritten, seeds = magic_rules(rules, (EX.c2, None, None))
+    assert rewritten is rules
+    assert len(seeds) == 0
+
+
+def test_magic_stratified_neighbourhood() -> None:
+    rules, facts = _split(CHAIN)
+    goal = (EX.c2, EX.a, None)
+    inferred = magic_stratified(facts, rules, goal)
+    expected = stratified(facts, rules)
+    assert (
+        _answers(inferred, goal) == _answers(expected, goal) == {(EX.c2, EX.a, EX.c4)}
+    )
+    # Nothing about the other chain was derived
+    assert (EX.d0, EX.a, EX.d2) not in inferred
+    assert len(inferred) < len(expected)
+    assert not any(is_magic(triple) for triple in inferred)
+
+
+def test_magic_stratified_bound_object() -> None:
+    rules, facts = _split(CHAIN)
+    goal = (None, EX.a, EX.c3)
+    expected = set(facts.triples(goal)) | _answers(stratified(facts, rules), goal)
+    assert (
+        set(facts.triples(goal)) | _answers(magic_stratified(facts, rules, goal), goal)
+        == expected
+    )
+
+
+def test_magic_stratified_negation() -> None:
+    rules, facts = _split(NEGATION)
+    goal = (EX.t1, EX.blockedBy, None)
+    inferred = magic_stratified(facts, rules, goal)
+    assert _answers(inferred, goal) == {(EX.t1, EX.blockedBy, EX.t2)}
+
+
+def test_magic_stratified_unbound_conclusion() -> None:
+    action = "tests/n3/single-pass/unbound-variable-in-conclusion.n3"
+    rules, facts = split_rules_and_facts(Graph().parse(action, format="n3"))
+    goal = (None, URIRef("http://example.com#b"), None)
+    inferred = magic_stratified(facts, rules, goal)
+    expected = _answers(stratified(facts, rules), goal)
+    assert len(_answers(inferred, goal)) == len(expected)
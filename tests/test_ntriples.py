@@ -0,0 +1,119 @@
+from io import StringIO
+from pathlib import Path
+
+import pytest
+from rdflib import BNode, Graph, Literal, URIRef
+from rdflib.compare import isomorphic
+from rdflib.graph import ConjunctiveGraph
+from rdflib.namespace import XSD
+
+from knom import ntriples
+from knom.store import encoded
+from knom.stratified import stratified, stratified_triples
+from knom.util import split_rules_and_facts
+
+from . import EX
+
+DOCUMENT = """
+@prefix : <http://example.com/>.
+:a :p :b.
+:b :p :c.
+{ ?x :p ?y } => { ?x :q ?y }.
+{ ?x :q ?y } => { ?x :p ?y. ?x :r [ :to ?y ] }.
+"""
+
+STATEMENTS = r"""# facts
+<http://example.com/a> <http://example.com/p> "caf\u00e9 \"x\"\n" .
+<http://example.com/a> <http://example.com/p> "chat"@fr . # comment
+<http://example.com/a> <http://example.com/p> "1"^^<http://www.w3.org/2001/XMLSchema#integer> <http://example.com/g> .
+
+<http://example.com/\u0062> <http://example.com/p> _:b1.
+"""  # noqa: E501
+
+
+def test_read(tmp_path: Path) -> None:
+    path = tmp_path / "facts.nq"
+    path.write_text(STATEMENTS)
+    triples = list(ntriples.read(path))
+    assert triples[:3] == [
+        (EX.a, EX.p, Literal('café "x"\n')),
+        (EX.a, EX.p, Literal("chat", lang="fr")),
+        (EX.a, EX.p, Literal("1", datatype=XSD.integer)),
+    ]
+    [(s, p, o)] = triples[3:]
+    assert (s, p) == (EX.b, EX.p)
+    assert isinstance(o, BNode)
+
+
+def test_read_invalid(tmp_path: Path) -> None:
+    path = tmp_path / "facts.nt"
+    path.write_text("<http://example.com/a> <http://example.com/p> .\n")
+    with pytest.raises(ValueError, match="facts.nt:1"):
+        list(ntriples.read(path))
+
+
+def test_load(tmp_path: Path) -> None:
+    path = tmp_path / "facts.nt"
+    path.write_text(STATEMENTS)
+    facts = encoded([(EX.a, EX.p, EX.b)])
+    assert ntriples.load(path, facts) is facts
+    assert len(facts) == 5
+    assert isomorphic(facts, encoded([(EX.a, EX.p, EX.b), *ntriples.read(path)]))
+    assert len(ntriples.load(tmp_path / "facts.nt")) == 4
+
+
+def test_load_scopes_blank_nodes() -> None:
+    document = (
+        "_:b1 <http://example.com/p> _:b1 .\n_:b1 <http://example.com/q> _:b2 .\n"
+    )
+    facts = ntriples.loads(document)
+    ntriples.loads(document, facts)
+    # Each document's labels name blank nodes of their own
+    assert len(facts) == 4
+    assert len({s for s, _, _ in facts}) == 2
+    assert all(s == o for s, p, o in facts if p == EX.p)
+    assert ntriples.parse_term("_:b1") == BNode("b1")
+
+
+def test_load_empty(tmp_path: Path) -> None:
+    path = tmp_path / "facts.nt"
+    path.write_text("")
+    assert len(ntriples.load(path)) == 0
+
+
+def test_write_round_trip() -> None:
+    triples = [
+        (EX.a, EX.p, Literal('say "hi"\n\tbye\\')),
+        (EX.a, EX.p, Literal("chat", lang="fr")),
+        (EX.a, EX.p, Literal(1)),
+        (BNode("b1"), EX.p, Literal(1.5, datatype=XSD.double)),
+        (EX.a, EX.p, Literal("é")),
+    ]
+    out = StringIO()
+    assert ntriples.write(triples, out) == len(triples)
+    g = Graph().parse(data=out.getvalue(), format="nt")
+    assert len(g) == len(triples)
+    for s, p, o in triples:
+        assert (None, p, o) in g
+        if isinstance(s, URIRef):
+            assert (s, p, o) in g
+
+
+def test_write_quads() -> None:
+    out = StringIO()
+    ntriples.write([(EX.a, EX.p, EX.b)], out, EX.g)
+    g = ConjunctiveGraph().parse(data=out.getvalue(), format="nquads")
+    assert (EX.a, EX.p, EX.b, EX.g) in g
+
+
+def test_write_skips_formulas() -> None:
+    out = StringIO()
+    assert ntriples.write([(EX.a, EX.p, Graph())], out) == 0
+    assert out.getvalue() == ""
+
+
+def test_stratified_triples() -> None:
+    rules, facts = split_rules_and_facts(Graph().parse(data=DOCUMENT, format="n3"))
+    triples = list(stratified_triples(facts, rules))
+    assert len(triples) == len(set(triples))
+    assert set(triples) == set(stratified(facts, rules))
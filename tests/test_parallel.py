@@ -0,0 +1,70 @@
+from rdflib import Graph
+
+from knom import single_rule
+from knom.parallel import parallel_stratified, sharded_rule, strata_dependencies, waves
+from knom.program import Program
+from knom.stratified import stratified
+from knom.util import split_rules_and_facts
+
+WIDE = """
+@prefix : <http://example.com/>.
+@prefix log: <http://www.w3.org/2000/10/swap/log#>.
+:a :p :b.
+:b :q :c.
+{ ?x :p ?y } => { ?x :p2 ?y }.
+{ ?x :q ?y } => { ?x :q2 ?y }.
+{ ?x :p2 ?y. ?y :q2 ?z } => { ?x :r ?z }.
+{ ?x :q2 ?y. [] log:notIncludes { ?x :r ?y } } => { ?x :s ?y }.
+"""
+
+PEOPLE = """
+@prefix : <http://example.com/>.
+:a :knows :b, :c.
+:b :knows :c, :d.
+:c :knows :d.
+:d :knows :a.
+{ ?x :knows ?y. ?y :knows ?z } => { ?x :introduced [ :to ?z; :by ?y ] }.
+"""
+
+
+def _split(document: str) -> tuple[Graph, Graph]:
+    return split_rules_and_facts(Graph().parse(data=document, format="n3"))
+
+
+def test_waves() -> None:
+    rules, facts = _split(WIDE)
+    program = Program(rules)
+    dependencies = strata_dependencies(program.strata)
+    grouped = waves(dependencies)
+    assert [len(wave) for wave in grouped] == [2, 1, 1]
+    for i, wave in enumerate(grouped):
+        for stratum in wave:
+            assert all(
+                j in (w for earlier in grouped[:i] for w in earlier)
+                for j in dependencies[stratum]
+            )
+
+
+def test_parallel_stratified() -> None:
+    rules, facts = _split(WIDE)
+    expected = set(stratified(facts, rules))
+    assert set(parallel_stratified(facts, rules, workers=1)) == expected
+    assert set(parallel_stratified(facts, rules, workers=2)) == expected
+
+
+def test_sharded_rule() -> None:
+    rules, facts = _split(PEOPLE)
+    rule = next(iter(rules))
+    expected = set(single_rule(facts, rule))
+    for shards in (1, 2, 3, 8):
+        inferred = list(sharded_rule(facts, rule, shards=shards))
+        assert len(inferred) == len(set(inferred))
+        # Blank nodes are named after the same bindings
+        assert set(inferred) == expected
+
+
+def test_parallel_stratified_shards() -> None:
+    rules, facts = _split(PEOPLE)
+    assert set(parallel_stratified(facts, rules, workers=1, shards=3)) == set(
+        stratified(facts, rules)
+    )
@@ -0,0 +1,175 @@
+from rdflib import BNode, Graph, Literal
+from rdflib.collection import Collection
+
+from knom import fire_rule
+from knom.builtins import LOG, MATH
+from knom.join import run_batch
+from knom.plan import (
+    BuiltinStep,
+    MatchStep,
+    NegationStep,
+    RulePlan,
+    compile_body,
+    compile_head,
+    run_plan,
+)
+
+from . import EX, bn_a, bn_b, var_a, var_b, var_c
+
+
+def test_compile_head_builtins_last() -> None:
+    head = [(var_a, MATH.lessThan, var_b), (var_a, EX.p, var_b)]
+    plan = compile_head(head)
+    assert [type(step) for step in plan.steps] == [MatchStep, BuiltinStep]
+
+
+def test_compile_head_builtin_lists() -> None:
+    head = Graph()
+    Collection(head, bn_a, [var_a, var_b])
+    head.add((bn_a, LOG.forAllIn, var_c))
+    head.add((var_a, EX.p, var_b))
+    plan = compile_head(head)
+    assert len(plan.steps) == 2
+    step = plan.steps[1]
+    assert isinstance(step, BuiltinStep)
+    assert step.subject == [var_a, var_b]
+
+
+def test_compile_head_slots() -> None:
+    plan = compile_head([(var_a, EX.p, var_b), (var_b, EX.p, var_c)], {var_c: EX.c})
+    assert set(plan.slots) == {var_a, var_b, var_c}
+    assert sorted(plan.slots.values()) == [0, 1, 2]
+
+
+def test_compile_head_first() -> None:
+    first = (var_a, EX.p, var_b)
+    plan = compile_head([first, (var_b, EX.p, var_c)], first=first)
+    step = plan.steps[0]
+    assert isinstance(step, MatchStep)
+    assert step.delta
+    assert step.clause == first
+
+
+def test_run_plan() -> None:
+    facts = Graph()
+    facts.add((EX.a, EX.p, EX.b))
+    facts.add((EX.b, EX.p, EX.c))
+    facts.add((EX.b, EX.q, Literal(1)))
+    plan = compile_head([(var_a, EX.p, var_b), (var_b, EX.p, var_c)])
+    assert list(run_plan(plan, facts)) == [{var_a: EX.a, var_b: EX.b, var_c: EX.c}]
+
+
+def test_run_plan_delta() -> None:
+    facts = Graph()
+    facts.add((EX.a, EX.p, EX.b))
+    facts.add((EX.b, EX.p, EX.c))
+    delta = Graph()
+    delta.add((EX.a, EX.p, EX.b))
+    first = (var_b, EX.p, var_c)
+    plan = compile_head([(var_a, EX.p, var_b), first], first=first)
+    assert list(run_plan(plan, facts, delta=delta)) == []
+
+
+def _formula(*triples: tuple) -> Graph:
+    formula = Graph()
+    for triple in triples:
+        formula.add(triple)
+    return formula
+
+
+def test_compile_head_negation_last() -> None:
+    negation = (bn_b, LOG.notIncludes, _formula((var_a, EX.q, var_c)))
+    plan = compile_head([negation, (var_a, MATH.lessThan, var_b), (var_a, EX.p, var_b)])
+    assert [type(step) for step in plan.steps] == [MatchStep, BuiltinStep, NegationStep]
+
+
+def test_run_plan_negation() -> None:
+    facts = Graph()
+    facts.add((EX.a, EX.p, EX.b))
+    facts.add((EX.b, EX.p, EX.c))
+    facts.add((EX.b, EX.q, EX.d))
+    facts.add((EX.b, EX.q, EX.e))
+    negation = (bn_b, LOG.notIncludes, _formula((var_b, EX.q, var_c)))
+    plan = compile_head([(var_a, EX.p, var_b), negation])
+    expected = [{var_a: EX.b, var_b: EX.c}]
+    assert list(run_plan(plan, facts)) == expected
+    assert list(run_batch(plan, facts)) == expected
+
+
+def test_run_plan_negation_scope() -> None:
+    facts = Graph()
+    facts.add((EX.a, EX.p, EX.b))
+    facts.add((EX.b, EX.q, EX.c))
+    scope = _formula((EX.a, EX.q, EX.c))
+    negation = (scope, LOG.notIncludes, _formula((var_a, EX.q, var_c)))
+    plan = compile_head([(var_a, EX.p, var_b), negation])
+    assert list(run_plan(plan, facts)) == []
+
+
+def _graph(*triples: tuple) -> Graph:
+    g = Graph()
+    for triple in triples:
+        g.add(triple)
+    return g
+
+
+def test_compile_body() -> None:
+    conclusion = compile_body(_graph((var_a, EX.p, EX.b), (EX.c, EX.p, EX.d)))
+    assert conclusion.variables == [var_a]
+    assert set(conclusion.fire({var_a: EX.a, var_b: EX.x})) == {
+        (EX.a, EX.p, EX.b),
+        (EX.c, EX.p, EX.d),
+    }
+
+
+def test_compile_body_unbound() -> None:
+    conclusion = compile_body(_graph((var_a, EX.p, var_b), (bn_a, EX.p, EX.b)))
+    triples = set(conclusion.fire({var_a: EX.a}, {bn_a: EX.named}))
+    assert (EX.named, EX.p, EX.b) in triples
+    # Unbound variables conclude fresh blank nodes
+    [(_, _, o)] = triples - {(EX.named, EX.p, EX.b)}
+    assert isinstance(o, BNode)
+
+
+def test_compile_body_formulas() -> None:
+    ground = _graph((EX.a, EX.p, EX.b))
+    conclusion = compile_body(
+        _graph(
+            (var_a, EX.says, ground), (var_a, EX.thinks, _graph((var_a, EX.p, var_b)))
+        )
+    )
+    first = dict((p, o) for _, p, o in conclusion.fire({var_a: EX.x, var_b: EX.y}))
+    second = dict((p, o) for _, p, o in conclusion.fire({var_a: EX.z, var_b: EX.y}))
+    # Ground formulas are built for each firing, changing one leaves the others
+    assert first[EX.says] is not second[EX.says]
+    first[EX.says].add((EX.a, EX.p, EX.c))
+    assert set(second[EX.says]) == set(ground)
+    assert set(
+        dict((p, o) for _, p, o in conclusion.fire({var_a: EX.x}))[EX.says]
+    ) == set(ground)
+    assert set(first[EX.thinks]) == {(EX.x, EX.p, EX.y)}
+    assert set(second[EX.thinks]) == {(EX.z, EX.p, EX.y)}
+
+
+def test_fire_rule_keeps_bindings() -> None:
+    rule = (_graph((var_a, EX.p, var_b)), LOG.implies, _graph((var_a, EX.q, bn_b)))
+    bindings = {var_a: EX.a, var_b: EX.b}
+    triples = list(fire_rule(rule, bindings))
+    assert bindings == {var_a: EX.a, var_b: EX.b}
+    assert triples == list(fire_rule(rule, bindings))
+
+
+def test_fire_rule_changed_body() -> None:
+    body = _graph((var_a, EX.q, EX.b))
+    rule = (_graph((var_a, EX.p, var_b)), LOG.implies, body)
+    assert set(fire_rule(rule, {var_a: EX.a})) == {(EX.a, EX.q, EX.b)}
+    body.add((var_a, EX.r, EX.c))
+    assert set(fire_rule(rule, {var_a: EX.a})) == {
+        (EX.a, EX.q, EX.b),
+        (EX.a, EX.r, EX.c),
+    }
+    plan = RulePlan(rule)
+    assert plan.conclusion is not None
+    assert list(fire_rule(rule, {var_a: EX.a}, plan)) == list(
+        plan.conclusion.fire({var_a: EX.a})
+    )
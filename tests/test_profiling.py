@@ -0,0 +1,52 @@
+from rdflib import Graph
+
+from knom import trace
+from knom.plan import compile_head, run_plan
+from knom.profiling import Profile
+from knom.stratified import stratified
+from knom.util import LOG
+
+from . import EX, var_a, var_b, var_c
+
+
+def test_profile_counts() -> None:
+    facts = Graph()
+    facts.add((EX.a, EX.p, EX.b))
+    facts.add((EX.b, EX.p, EX.c))
+    head = Graph()
+    head.add((var_a, EX.p, var_b))
+    head.add((var_b, EX.p, var_c))
+    body = Graph()
+    body.add((var_a, EX.p, var_c))
+    rules = Graph()
+    rule = (head, LOG.implies, body)
+    rules.add(rule)
+    with trace.tracing(Profile()) as profile:
+        stratified(facts, rules)
+    assert len(profile.strata) == 1
+    assert profile.strata[0].inferred == 1
+    rule_profile = profile.rules[rule]
+    assert rule_profile.evaluations >= 1
+    assert rule_profile.new == 1
+    assert rule_profile.duplicates == rule_profile.fired - 1
+    assert rule_profile.bindings >= 1
+    assert sum(rule_profile.scanned.values()) > 0
+    assert profile.to_dict()["rules"][0]["new"] == 1
+    assert trace.sinks == []
+
+
+def test_events_on_early_exit() -> None:
+    facts = Graph()
+    facts.add((EX.a, EX.p, EX.b))
+    facts.add((EX.b, EX.p, EX.c))
+    head = Graph()
+    head.add((var_a, EX.p, var_b))
+    events: list[tuple[str, dict]] = []
+    with trace.tracing(lambda event, fields: events.append((event, fields))):
+        matches = run_plan(compile_head(head), facts)
+        next(matches)
+        matches.close()
+    emitted = dict(events)
+    assert emitted.keys() == {"step", "matched"}
+    assert emitted["step"]["scanned"] == 1
+    assert emitted["matched"]["bindings"] == 1
@@ -0,0 +1,51 @@
+from pathlib import Path
+
+from rdflib import Graph
+
+from knom.program import Program, cached_program, rules_digest
+from knom.statistics import Statistics
+from knom.stratified import stratified
+from knom.util import split_rules_and_facts
+
+DOCUMENT = """
+@prefix : <http://example.com/>.
+@prefix log: <http://www.w3.org/2000/10/swap/log#>.
+:a :p :b.
+:b :p :c.
+{ ?x :p ?y. ?y :p ?z } => { ?x :p ?z }.
+{ ?x :p ?y } => { ?y :q [ :from ?x ] }.
+{ ?x :p ?y. [] log:notIncludes { ?y :p ?z } } => { ?y a :Leaf }.
+"""
+
+
+def _split(document: str) -> tuple[Graph, Graph]:
+    return split_rules_and_facts(Graph().parse(data=document, format="n3"))
+
+
+def test_rules_digest() -> None:
+    rules, _ = _split(DOCUMENT)
+    again, _ = _split(DOCUMENT)
+    assert rules_digest(rules) == rules_digest(again)
+    other, _ = _split(DOCUMENT.replace(":Leaf", ":End"))
+    assert rules_digest(rules) != rules_digest(other)
+
+
+def test_program_stratified() -> None:
+    rules, facts = _split(DOCUMENT)
+    program = Program(rules, Statistics.of(facts))
+    assert len(stratified(facts, rules, program=program)) == len(
+        stratified(facts, rules)
+    )
+
+
+def test_cached_program(tmp_path: Path) -> None:
+    rules, facts = _split(DOCUMENT)
+    program = cached_program(rules, tmp_path, Statistics.of(facts))
+    assert len(list(tmp_path.iterdir())) == 1
+    again, facts_again = _split(DOCUMENT)
+    loaded = cached_program(again, tmp_path)
+    assert loaded.digest == program.digest
+    assert loaded.rules is not again
+    assert len(stratified(facts_again, again, program=loaded)) == len(
+        stratified(facts, rules)
+    )
@@ -0,0 +1,168 @@
+from rdflib import Graph, URIRef
+
+from knom.reasoner import Reasoner
+from knom.stratified import stratified
+from knom.util import add_triples, split_rules_and_facts
+
+from . import EX, generate_tests_from_manifests, postprocess
+
+TRANSITIVE = """
+@prefix : <http://example.com/>.
+:a :p :b.
+:b :p :c.
+{ ?x :p ?y. ?y :p ?z } => { ?x :p ?z }.
+"""
+
+NEGATION = """
+@prefix : <http://example.com/>.
+@prefix log: <http://www.w3.org/2000/10/swap/log#>.
+:t a :Task.
+{ ?t a :Task. [] log:notIncludes { ?t :state :Done } } => { ?t :state :Open }.
+{ ?t :state :Open } => { ?t :needs :work }.
+"""
+
+UNBOUND = """
+@prefix : <http://example.com/>.
+:a :a :a.
+:b :b :b.
+{ ?a ?a ?a } => { ?a :x ?b }.
+"""
+
+MANIFESTS = {
+    "test_reasoner_positive": "tests/n3/positive-non-recursive-rules-manifests.n3",
+    "test_reasoner_recursive": "tests/n3/recursive-manifests.n3",
+    "test_reasoner_negative": "tests/n3/negative-manifests.n3",
+    "test_reasoner_builtins": "tests/n3/builtins-manifests.n3",
+}
+
+
+def pytest_generate_tests(metafunc) -> None:  # noqa: ANN001
+    if metafunc.function.__name__ in MANIFESTS:
+        generate_tests_from_manifests(MANIFESTS[metafunc.function.__name__], metafunc)
+
+
+def _split(document: str) -> tuple[Graph, Graph]:
+    return split_rules_and_facts(Graph().parse(data=document, format="n3"))
+
+
+def test_reasoner_closure() -> None:
+    rules, facts = _split(TRANSITIVE)
+    reasoner = Reasoner(rules, facts)
+    assert set(reasoner.closure) == set(facts) | set(stratified(facts, rules))
+    assert set(reasoner.inferred) == {(EX.a, EX.p, EX.c)}
+
+
+def test_reasoner_add() -> None:
+    rules, facts = _split(TRANSITIVE)
+    reasoner = Reasoner(rules, facts)
+    added = reasoner.add([(EX.c, EX.p, EX.d)])
+    assert set(added) == {(EX.c, EX.p, EX.d), (EX.b, EX.p, EX.d), (EX.a, EX.p, EX.d)}
+    facts.add((EX.c, EX.p, EX.d))
+    assert set(reasoner.closure) == set(facts) | set(stratified(facts, rules))
+    assert len(reasoner.add([(EX.c, EX.p, EX.d)])) == 0
+
+
+def test_reasoner_add_inferred() -> None:
+    rules, facts = _split(TRANSITIVE)
+    reasoner = Reasoner(rules, facts)
+    assert len(reasoner.add([(EX.a, EX.p, EX.c)])) == 0
+    assert (EX.a, EX.p, EX.c) in reasoner.facts
+    assert len(reasoner.closure) == len(set(reasoner.closure))
+
+
+def test_reasoner_add_withdraws_negated() -> None:
+    rules, facts = _split(NEGATION)
+    reasoner = Reasoner(rules, facts)
+    assert (EX.t, EX.needs, EX.work) in reasoner.closure
+    added = reasoner.add([(EX.t, EX.state, EX.Done)])
+    assert set(added) == {(EX.t, EX.state, EX.Done)}
+    assert (EX.t, EX.state, EX.Open) not in reasoner.closure
+    assert (EX.t, EX.needs, EX.work) not in reasoner.closure
+
+
+def test_reasoner_remove() -> None:
+    rules, facts = _split(TRANSITIVE)
+    reasoner = Reasoner(rules, facts)
+    removed = reasoner.remove([(EX.b, EX.p, EX.c)])
+    assert set(removed) == {(EX.b, EX.p, EX.c), (EX.a, EX.p, EX.c)}
+    assert set(reasoner.closure) == {(EX.a, EX.p, EX.b)}
+    assert len(reasoner.remove([(EX.a, EX.p, EX.c)])) == 0
+
+
+def test_reasoner_remove_rederives() -> None:
+    rules, facts = _split(TRANSITIVE)
+    facts.add((EX.a, EX.p, EX.c))
+    facts.add((EX.c, EX.p, EX.d))
+    reasoner = Reasoner(rules, facts)
+    # Still inferred from a p b and b p c, and so is a p d
+    assert len(reasoner.remove([(EX.a, EX.p, EX.c)])) == 0
+    assert (EX.a, EX.p, EX.c) in reasoner.inferred
+    assert (EX.a, EX.p, EX.d) in reasoner.inferred
+    facts.remove((EX.a, EX.p, EX.c))
+    assert set(reasoner.closure) == set(facts) | set(stratified(facts, rules))
+
+
+def test_reasoner_remove_restores_negated() -> None:
+    rules, facts = _split(NEGATION)
+    facts.add((EX.t, EX.state, EX.Done))
+    reasoner = Reasoner(rules, facts)
+    assert (EX.t, EX.needs, EX.work) not in reasoner.closure
+    reasoner.remove([(EX.t, EX.state, EX.Done)])
+    assert (EX.t, EX.state, EX.Open) in reasoner.closure
+    assert (EX.t, EX.needs, EX.work) in reasoner.closure
+
+
+def test_reasoner_remove_asserted_inferred() -> None:
+    rules, facts = _split(NEGATION)
+    reasoner = Reasoner(rules, facts)
+    # Asserted while inferred, then retracted: still inferred
+    reasoner.add([(EX.t, EX.state, EX.Open)])
+    assert len(reasoner.remove([(EX.t, EX.state, EX.Open)])) == 0
+    assert (EX.t, EX.state, EX.Open) in reasoner.closure
+    assert set(reasoner.closure) == set(facts) | set(stratified(facts, rules))
+
+
+def test_reasoner_remove_unbound_conclusion() -> None:
+    rules, facts = _split(UNBOUND)
+    reasoner = Reasoner(rules, facts)
+    # Firing again names the unbound node anew
+    removed = reasoner.remove([(EX.a, EX.a, EX.a)])
+    assert {(s, p) for s, p, _ in removed} >= {(EX.a, EX.a), (EX.a, EX.x)}
+    assert [(s, p) for s, p, _ in reasoner.inferred] == [(EX.b, EX.x)]
+
+
+def _closure(rules: Graph, facts: Graph) -> Graph:
+    return add_triples(Graph(), [*facts, *stratified(facts, rules)])
+
+
+def _check_maintenance(action: URIRef) -> None:
+    """Retract half of the facts and add them back, comparing with a recomputation."""
+    rules, facts = split_rules_and_facts(Graph().parse(location=action, format="n3"))
+    triples = sorted(facts)
+    removed = triples[: len(triples) // 2]
+    reasoner = Reasoner(rules, facts)
+    reasoner.remove(removed)
+    remaining = add_triples(Graph(), triples[len(triples) // 2 :])
+    assert postprocess(add_triples(Graph(), reasoner.closure)) == postprocess(
+        _closure(rules, remaining)
+    )
+    reasoner.add(removed)
+    assert postprocess(add_triples(Graph(), reasoner.closure)) == postprocess(
+        _closure(rules, facts)
+    )
+
+
+def test_reasoner_positive(action: URIRef, result: URIRef) -> None:  # noqa: ARG001
+    _check_maintenance(action)
+
+
+def test_reasoner_recursive(action: URIRef, result: URIRef) -> None:  # noqa: ARG001
+    _check_maintenance(action)
+
+
+def test_reasoner_negative(action: URIRef, result: URIRef) -> None:  # noqa: ARG001
+    _check_maintenance(action)
+
+
+def test_reasoner_builtins(action: URIRef, result: URIRef) -> None:  # noqa: ARG001
+    _check_maintenance(action)
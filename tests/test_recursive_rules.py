@@ -1,9 +1,13 @@
 import logging
 
-from rdflib import URIRef
+from rdflib import Graph, Namespace, URIRef
+
+from knom.stratified import stratified
+from knom.util import split_rules_and_facts
 
 from . import (
     generate_tests_from_manifests,
+    postprocess,
     run_n3_tests,
 )
 
@@ -11,6 +15,8 @@ logging.getLogger("knom").setLevel(logging.DEBUG)
 logging.getLogger("knom.stratified").setLevel(logging.DEBUG)
 
 def pytest_generate_tests(metafunc) -> None:  # noqa: ANN001
+    if "action" not in metafunc.fixturenames:
+        return
     generate_tests_from_manifests(
         "tests/n3/recursive-manifests.n3", metafunc
     )
@@ -18,3 +24,50 @@ def pytest_generate_tests(metafunc) -> None:  # noqa: ANN001
 
 def test_recursive(action: URIRef, result: URIRef) -> None:
     run_n3_tests(action, result)
+
+
+def test_recursive_naive(action: URIRef, result: URIRef) -> None:  # noqa: ARG001
+    action_graph = Graph().parse(location=action, format="n3")
+    rules, facts = split_rules_and_facts(action_graph)
+    output = stratified(facts, rules, semi_naive=False)
+    assert postprocess(output) == postprocess(stratified(facts, rules))
+
+
+def _guard(size: int) -> str:
+    """The grammar of n3/guard/simple-rec-guard.n3 over size tokens."""
+    facts = "".join(
+        f"[] a test:B; p:start {i}; p:end {i + 1}.\n" for i in range(1, size)
+    )
+    return f"""@prefix log: <http://www.w3.org/2000/10/swap/log#>.
+@prefix p: <http://example.com/parser#>.
+@prefix test: <http://example.com/test#>.
+[] a test:C; p:start 0; p:end 1.
+{facts}{{
+  [] a test:C; p:start ?a; p:end ?c.
+}} log:impliedBy {{
+  [] a test:C; p:start ?a; p:end ?b.
+  [] a test:B; p:start ?b; p:end ?c.
+}}.
+"""
+
+
+def test_guard_long_sequence() -> None:
+    rules, facts = split_rules_and_facts(Graph().parse(data=_guard(40), format="n3"))
+    output = stratified(facts, rules)
+    parser = Namespace("http://example.com/parser#")
+    # A C node spanning from 0 to each token end but the first
+    ends = {o.toPython() for o in output.objects(None, parser.end)}
+    assert ends == set(range(2, 41))
+
+
+def test_variable_premise_fired_once() -> None:
+    document = "tests/n3/confusing/var-statement-true.n3"
+    rules, facts = split_rules_and_facts(Graph().parse(document, format="n3"))
+    ex = Namespace("http://example.com/")
+    for semi_naive in (True, False):
+        output = stratified(facts, rules, semi_naive=semi_naive)
+        formulas = {frozenset(o) for o in output.objects(ex.result, ex["is"])}
+        assert formulas == {
+            frozenset({(ex.a, ex.b, ex.c)}),
+            frozenset({(ex.d, ex.e, ex.f)}),
+        }
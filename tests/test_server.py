@@ -0,0 +1,119 @@
+import threading
+from collections.abc import Iterator
+from urllib.error import HTTPError
+from urllib.parse import urlencode
+from urllib.request import Request, urlopen
+
+import pytest
+from rdflib import Graph
+
+from knom.server import Service, make_server
+from knom.util import split_rules_and_facts
+
+DOCUMENT = """
+@prefix : <http://example.com/>.
+:a :p :b.
+:b :p :c.
+{ ?x :p ?y } => { ?x :anc ?y }.
+{ ?x :anc ?y. ?y :anc ?z } => { ?x :anc ?z }.
+"""
+
+
+def _serve(closure: bool) -> Iterator[str]:
+    rules, facts = split_rules_and_facts(Graph().parse(data=DOCUMENT, format="n3"))
+    server = make_server(Service(rules, facts if closure else None), port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture()
+def url() -> Iterator[str]:
+    yield from _serve(closure=True)
+
+
+@pytest.fixture()
+def stateless_url() -> Iterator[str]:
+    yield from _serve(closure=False)
+
+
+def _post(url: str, data: str, content_type: str = "application/n-triples") -> set[str]:
+    request = Request(url, data=data.encode(), headers={"Content-Type": content_type})  # noqa: S310
+    with urlopen(request) as response:  # noqa: S310
+        return set(response.read().decode().splitlines())
+
+
+def _get(url: str, **pattern: str) -> set[str]:
+    with urlopen(f"{url}?{urlencode(pattern)}") as response:  # noqa: S310
+        return set(response.read().decode().splitlines())
+
+
+def test_infer(stateless_url: str) -> None:
+    inferred = _post(
+        f"{stateless_url}/infer",
+        "<http://example.com/x> <http://example.com/p> <http://example.com/y> .",
+    )
+    assert inferred == {
+        "<http://example.com/x> <http://example.com/anc> <http://example.com/y> ."
+    }
+    inferred = _post(
+        f"{stateless_url}/infer",
+        "@prefix : <http://example.com/>. :m :p :n.",
+        "text/n3",
+    )
+    assert inferred == {
+        "<http://example.com/m> <http://example.com/anc> <http://example.com/n> ."
+    }
+
+
+def test_closure(url: str) -> None:
+    query = {"s": "<http://example.com/a>", "p": "<http://example.com/anc>"}
+    assert _get(f"{url}/query", **query) == {
+        "<http://example.com/a> <http://example.com/anc> <http://example.com/b> .",
+        "<http://example.com/a> <http://example.com/anc> <http://example.com/c> .",
+    }
+    added = _post(
+        f"{url}/facts",
+        "<http://example.com/c> <http://example.com/p> <http://example.com/d> .",
+    )
+    assert (
+        "<http://example.com/a> <http://example.com/anc> <http://example.com/d> ."
+        in added
+    )
+    assert len(_get(f"{url}/query", **query)) == 3
+    _post(
+        f"{url}/retract",
+        "<http://example.com/b> <http://example.com/p> <http://example.com/c> .",
+    )
+    assert _get(f"{url}/query", **query) == {
+        "<http://example.com/a> <http://example.com/anc> <http://example.com/b> ."
+    }
+
+
+def test_errors(url: str, stateless_url: str) -> None:
+    with pytest.raises(HTTPError) as e:
+        _post(f"{url}/infer", "not a triple")
+    assert e.value.code == 400
+    with pytest.raises(HTTPError) as e:
+        _get(f"{stateless_url}/query")
+    assert e.value.code == 409
+    with pytest.raises(HTTPError) as e:
+        _get(f"{url}/nothing")
+    assert e.value.code == 404
+
+
+def test_internal_error(url: str, monkeypatch: pytest.MonkeyPatch) -> None:
+    def infer(self: Service, facts: Graph) -> None:  # noqa: ARG001
+        message = "broken"
+        raise RuntimeError(message)
+
+    monkeypatch.setattr(Service, "infer", infer)
+    with pytest.raises(HTTPError) as e:
+        _post(f"{url}/infer", "")
+    assert e.value.code == 500
+    assert e.value.read().decode() == "broken\n"
+    assert _get(f"{url}/query", s="<http://example.com/a>") != set()
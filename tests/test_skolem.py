@@ -0,0 +1,80 @@
+from hashlib import sha256
+
+from rdflib import BNode, Graph, Literal
+
+from knom import fire_rule, skolem
+from knom.util import get_body, split_rules_and_facts
+
+from . import EX, var_a, var_b
+
+RULE = """
+@prefix : <http://example.com/>.
+{ ?a :p ?b } => { ?a :q [ :r [] ] }.
+"""
+
+
+def _rule() -> tuple:
+    rules, _ = split_rules_and_facts(Graph().parse(data=RULE, format="n3"))
+    return next(iter(rules))
+
+
+def _names(rule: tuple, b: object = EX.y) -> set:
+    conclusions = fire_rule(rule, {var_a: EX.x, var_b: b})  # type: ignore[dict-item]
+    return {
+        node for triple in conclusions for node in triple if isinstance(node, BNode)
+    }
+
+
+def test_names_deterministic() -> None:
+    rule = _rule()
+    names = _names(rule)
+    assert len(names) == 2
+    assert _names(rule) == names
+    # Every binding of the match tells firings apart, like earlier releases
+    assert _names(rule, Literal("y")).isdisjoint(names)
+
+
+def test_names_keyed_by_variables() -> None:
+    body = get_body(_rule())
+    assert isinstance(body, Graph)
+    names = skolem.bnode_names(body, {var_a: EX.x})
+    other = skolem.bnode_names(body, {var_b: EX.x})
+    assert other.keys() == names.keys()
+    assert set(other.values()).isdisjoint(names.values())
+
+
+def test_term_digests() -> None:
+    assert skolem.term_digest(EX.x) != skolem.term_digest(Literal(str(EX.x)))
+    assert skolem.term_digest(Literal("1")) != skolem.term_digest(Literal(1))
+    formula = Graph().add((EX.x, EX.p, EX.y))
+    same = Graph().add((EX.x, EX.p, EX.y))
+    other = Graph().add((EX.x, EX.p, EX.z))
+    assert skolem.term_digest(formula) == skolem.term_digest(same)
+    assert skolem.term_digest(formula) != skolem.term_digest(other)
+
+
+def test_legacy_names() -> None:
+    rule = _rule()
+    body = get_body(rule)
+    bindings = {var_a: EX.x, var_b: EX.y}
+    base = "-".join(f"{node}:{value}" for node, value in sorted(bindings.items()))
+    expected = {
+        BNode(sha256(f"{base}-{node}".encode()).hexdigest())
+        for triple in body  # type: ignore[union-attr]
+        for node in triple
+        if isinstance(node, BNode)
+    }
+    with skolem.legacy_names():
+        assert skolem.legacy
+        assert _names(rule) == expected
+    assert not skolem.legacy
+    assert _names(rule).isdisjoint(expected)
+
+
+def test_names_follow_changed_body() -> None:
+    body = get_body(_rule())
+    assert isinstance(body, Graph)
+    names = skolem.bnode_names(body, {var_a: EX.x})
+    body.add((BNode(), EX.s, EX.t))
+    # Changing a conclusion names its new blank nodes as well
+    assert len(skolem.bnode_names(body, {var_a: EX.x})) == len(names) + 1
@@ -0,0 +1,57 @@
+from rdflib import Graph
+
+from knom.plan import compile_head
+from knom.statistics import Statistics
+from knom.store import encoded
+
+from . import EX, var_a, var_b, var_c
+
+TRIPLES = [
+    *((EX[f"a{i}"], EX.big, EX[f"b{i % 10}"]) for i in range(100)),
+    (EX.a1, EX.small, EX.c),
+]
+
+
+def test_statistics() -> None:
+    for g in [Graph(), encoded()]:
+        for triple in TRIPLES:
+            g.add(triple)
+        statistics = Statistics.of(g)
+        assert statistics.size == len(TRIPLES)
+        assert statistics.counts[EX.big] == 100
+        assert statistics.distinct[EX.big, 0] == 100
+        assert statistics.distinct[EX.big, 2] == 10
+
+
+def test_estimate() -> None:
+    statistics = Statistics.of(encoded(TRIPLES))
+    assert statistics.estimate((var_a, EX.big, var_b), set()) == 100
+    assert statistics.estimate((var_a, EX.big, var_b), {var_b}) == 10
+    assert statistics.estimate((var_a, EX.big, EX.b1), set()) == 10
+    assert statistics.estimate((var_a, EX.missing, var_b), set()) == 0
+
+
+def test_moved() -> None:
+    statistics = Statistics.of(encoded(TRIPLES))
+    assert not statistics.moved(statistics.copy())
+    more = statistics.copy()
+    more.update(Statistics.of(encoded(TRIPLES)))
+    assert statistics.moved(more)
+
+
+def test_cost_based_order() -> None:
+    statistics = Statistics.of(encoded(TRIPLES))
+    head = [(var_a, EX.big, var_b), (var_a, EX.small, var_c)]
+    plan = compile_head(head, statistics=statistics)
+    assert [step.clause for step in plan.steps] == [head[1], head[0]]
+
+
+def test_subtract() -> None:
+    statistics = Statistics.of(encoded(TRIPLES))
+    statistics.subtract(Statistics.of(encoded(TRIPLES[:90])))
+    assert statistics.size == 11
+    assert statistics.counts[EX.big] == 10
+    assert statistics.distinct[EX.big, 0] == 10
+    statistics.subtract(Statistics.of(encoded(TRIPLES[90:])))
+    assert statistics.size == 0
+    assert len(statistics.counts) == 0
@@ -0,0 +1,94 @@
+from knom.store import Dictionary, EncodedStore, encoded
+
+from . import EX, lit_a, lit_graph
+
+
+def test_dictionary() -> None:
+    dictionary = Dictionary()
+    id_ = dictionary.encode(EX.a)
+    assert dictionary.encode(EX.a) == id_
+    assert dictionary.decode(id_) == EX.a
+    assert dictionary.lookup(EX.b) is None
+
+
+def test_encoded_triples() -> None:
+    g = encoded([(EX.a, EX.b, EX.c), (EX.a, EX.b, EX.d), (EX.d, EX.e, EX.c)])
+    assert len(g) == 3
+    assert set(g.triples((EX.a, EX.b, None))) == {
+        (EX.a, EX.b, EX.c),
+        (EX.a, EX.b, EX.d),
+    }
+    assert set(g.triples((None, None, EX.c))) == {
+        (EX.a, EX.b, EX.c),
+        (EX.d, EX.e, EX.c),
+    }
+    assert set(g.triples((EX.d, None, EX.c))) == {(EX.d, EX.e, EX.c)}
+    assert set(g.triples((None, EX.b, EX.d))) == {(EX.a, EX.b, EX.d)}
+    assert set(g.triples((EX.x, None, None))) == set()
+
+
+def test_encoded_duplicates() -> None:
+    g = encoded([(EX.a, EX.b, EX.c), (EX.a, EX.b, EX.c)])
+    assert len(g) == 1
+
+
+def test_encoded_remove() -> None:
+    g = encoded([(EX.a, EX.b, EX.c), (EX.a, EX.b, EX.d)])
+    g.remove((None, None, EX.c))
+    assert set(g) == {(EX.a, EX.b, EX.d)}
+    assert (EX.a, EX.b, EX.c) not in g
+
+
+def test_encoded_large_group() -> None:
+    g = encoded((EX.a, EX.b, EX[f"o{i}"]) for i in range(1000))
+    assert (EX.a, EX.b, EX.o999) in g
+    g.remove((EX.a, EX.b, EX.o999))
+    assert (EX.a, EX.b, EX.o999) not in g
+    assert len(g) == 999
+
+
+def test_encoded_large_group_removals() -> None:
+    # Large groups of objects, of subjects, and of subject and predicate pairs
+    triples = [
+        *((EX.hub, EX.p, EX[f"o{i}"]) for i in range(400)),
+        *((EX[f"s{i}"], EX.p, EX.hub) for i in range(400)),
+        *((EX.s0, EX[f"p{i}"], EX.hub) for i in range(400)),
+    ]
+    g = encoded(triples)
+    removed = triples[::3]
+    for triple in removed:
+        g.remove(triple)
+    kept = set(triples) - set(removed)
+    assert set(g) == kept
+    assert len(g) == len(kept)
+    for pattern in [
+        (EX.s0, None, EX.hub),
+        (None, EX.p, EX.hub),
+        (EX.hub, EX.p, None),
+        (None, None, EX.hub),
+    ]:
+        expected = {
+            t
+            for t in kept
+            if all(n is None or n == v for n, v in zip(pattern, t, strict=True))
+        }
+        assert set(g.triples(pattern)) == expected
+    for triple in kept:
+        g.remove(triple)
+    assert len(g) == 0
+    assert isinstance(g.store, EncodedStore)
+    assert g.store.large == g.store.large_pos == g.store.large_osp == {}
+
+
+def test_encoded_graph_terms() -> None:
+    g = encoded([(EX.a, EX.says, lit_graph), (lit_a, EX.b, EX.c)])
+    assert set(g.triples((None, None, lit_graph))) == {(EX.a, EX.says, lit_graph)}
+
+
+def test_shared_dictionary() -> None:
+    dictionary = Dictionary()
+    g1 = encoded([(EX.a, EX.b, EX.c)], dictionary)
+    g2 = encoded([(EX.c, EX.b, EX.a)], dictionary)
+    assert isinstance(g1.store, EncodedStore)
+    assert isinstance(g2.store, EncodedStore)
+    assert len(dictionary) == 3
@@ -0,0 +1,49 @@
+import logging
+
+import pytest
+from rdflib import Graph
+
+from knom import trace
+from knom.stratified import stratified
+from knom.util import LOG
+
+from . import EX, var_a
+
+
+class _Unserializable(Graph):
+    def serialize(self, *args, **kwargs) -> str:  # noqa: ANN002, ANN003
+        raise AssertionError
+
+
+def test_trace_events() -> None:
+    facts = Graph()
+    facts.add((EX.a, EX.b, EX.c))
+    head = Graph()
+    head.add((var_a, EX.b, EX.c))
+    body = Graph()
+    body.add((var_a, EX.b, EX.d))
+    rules = Graph()
+    rules.add((head, LOG.implies, body))
+    events = []
+    with trace.tracing(lambda event, fields: events.append((event, fields))):
+        stratified(facts, rules)
+    assert [event for event, _ in events] == [
+        "stratum_start",
+        "rule_start",
+        "step",
+        "matched",
+        "rule_evaluated",
+        "stratum_end",
+    ]
+    assert events[2][1]["scanned"] == 1
+    assert events[3][1]["bindings"] == 1
+    assert events[4][1]["method"] == "single_rule"
+    assert events[4][1]["fired"] == 1
+    assert set(events[5][1]["inferred"]) == {(EX.a, EX.b, EX.d)}
+    assert trace.sinks == []
+
+
+def test_logging_sink_is_lazy(caplog: pytest.LogCaptureFixture) -> None:
+    caplog.set_level(logging.INFO, logger="knom.trace")
+    with trace.tracing(trace.LoggingSink()):
+        trace.emit("stratum_end", index=0, inferred=_Unserializable())
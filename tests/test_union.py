@@ -0,0 +1,33 @@
+import pytest
+from rdflib import Graph
+
+from knom.graph import union
+
+from . import EX
+
+
+def test_union() -> None:
+    facts = Graph()
+    facts.add((EX.a, EX.b, EX.c))
+    inferred = Graph()
+    inferred.add((EX.c, EX.b, EX.d))
+    g = union(facts, inferred)
+    assert len(g) == 2
+    assert set(g.triples((None, EX.b, None))) == {
+        (EX.a, EX.b, EX.c),
+        (EX.c, EX.b, EX.d),
+    }
+
+
+def test_union_is_live() -> None:
+    facts = Graph()
+    inferred = Graph()
+    g = union(facts, inferred)
+    inferred.add((EX.a, EX.b, EX.c))
+    assert (EX.a, EX.b, EX.c) in g
+
+
+def test_union_is_read_only() -> None:
+    g = union(Graph())
+    with pytest.raises(TypeError):
+        g.add((EX.a, EX.b, EX.c))